@@ -7,12 +7,15 @@ from .LoginData import APIKEY, APIID, TAURON_METER_ID, TAURON_USER_NAME, TAURON_
 from Energy import STORAGE_DIR, OUTPUT_DIR, get_debug 
 from Energy.subEnergy.my_energy import CommonEnergy, Energy
 from Energy.subTools.my_pdf import PDF
+from Energy.subTools.response_cache import ResponseCache
+from Energy.subTools.tools import period_bounds
 
 from Energy.subEnergy.my_solaredge import MySolarEdge
 from Energy.subEnergy.my_tauron import MyTauron, MyAPITauron
 
 
 MY_SOLAR_DATA = 'my_solar_data.csv'
+CACHE_DIR = STORAGE_DIR + 'cache/'
 
 PERIODS_CONVERTER = {
     'daily': 'day',
@@ -26,7 +29,15 @@ def create_energy_reports(
     export_back=0.8,
     kWh_cost=0.6,
     limit_periods = None,
+    workers = 1,
+    offline = False,
+    storage = 'csv',
+    save_png = False,
 ):
+    # API responses cache, offline - rebuild data only from cached responses
+    cache = ResponseCache(CACHE_DIR, offline=offline)
+    # read from storage only dates covered by limited periods
+    load_range = period_bounds(PERIODS_CONVERTER[group], *limit_periods) if limit_periods else None
     # create SorarEdge energy object. USE API SolarEdge
     solar_df = Energy(
         login_data = {'KEY' : APIKEY, "ID" : APIID, 'TIME_UNIT': "HOUR"}, 
@@ -36,7 +47,11 @@ def create_energy_reports(
         output_dir=OUTPUT_DIR,
         refresh=refresh,
         start_date = '2021-08-20',
-        kWh_cost = 0
+        kWh_cost = 0,
+        workers = workers,
+        cache = cache,
+        storage = storage,
+        load_range = load_range
     )
     if limit_periods: solar_df.limit_periods(PERIODS_CONVERTER[group], *limit_periods)
     if get_debug(): print(solar_df)
@@ -48,7 +63,11 @@ def create_energy_reports(
         output_dir=OUTPUT_DIR,
         refresh=refresh,
         start_date = '2021-08-20',
-        kWh_cost = 0
+        kWh_cost = 0,
+        workers = workers,
+        cache = cache,
+        storage = storage,
+        load_range = load_range
     )
     if limit_periods: tauron_df.limit_periods(PERIODS_CONVERTER[group], *limit_periods)
     if get_debug(): print(tauron_df)
@@ -57,10 +76,12 @@ def create_energy_reports(
     # join objects to one object
     my_energy_df = CommonEnergy(
         [solar_df,tauron_df], 
+        align = True,
         storage_dir =STORAGE_DIR, 
         output_dir=OUTPUT_DIR,
         export_back = export_back, 
-        kWh_cost = kWh_cost
+        kWh_cost = kWh_cost,
+        save_png = save_png
     )
     if get_debug(): print(my_energy_df)
 
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from ..subTools.tools import jit
+
+
+@jit
+def battery_kernel(surplus, deficit, capacity, charge_power, discharge_power, efficiency_in, efficiency_out):
+    #
+    #   hour by hour state of charge for all battery sizes at once (arrays of sizes),
+    #   surplus (export_) charges battery, deficit (import_) is covered from it.
+    #   returns import, export, state of charge: hours x sizes
+    #
+    n, sizes = len(surplus), len(capacity)
+    imports = np.empty((n, sizes))
+    exports = np.empty((n, sizes))
+    soc = np.empty((n, sizes))
+    charge = np.zeros(sizes)
+    for i in range(n):
+        stored = np.minimum(np.minimum(charge_power, surplus[i]), (capacity - charge) / efficiency_in)
+        charge = charge + stored * efficiency_in
+        taken = np.minimum(np.minimum(discharge_power, deficit[i]), charge * efficiency_out)
+        charge = charge - taken / efficiency_out
+        exports[i] = surplus[i] - stored
+        imports[i] = deficit[i] - taken
+        soc[i] = charge
+    return imports, exports, soc
+
+
+def simulate_battery(import_, export_, capacity, charge_power=None, discharge_power=None, efficiency=0.9, hours=1.0):
+    '''
+    replay hourly import_ / export_ through batteries.
+    capacity [kWh], charge_power / discharge_power [kW] (default 0.5 C) - one value or one per capacity,
+    efficiency - round trip (split evenly between charge and discharge), hours - length of one row.
+    returns import_, export_, soc_ arrays: rows x capacities
+    '''
+    capacity = np.atleast_1d(np.asarray(capacity, dtype=np.float64))
+    charge_power = capacity / 2 if charge_power is None else charge_power
+    discharge_power = charge_power if discharge_power is None else discharge_power
+    charge_power = np.broadcast_to(np.asarray(charge_power, dtype=np.float64) * hours, capacity.shape).copy()
+    discharge_power = np.broadcast_to(np.asarray(discharge_power, dtype=np.float64) * hours, capacity.shape).copy()
+    efficiency_in = efficiency_out = np.sqrt(efficiency)
+    imports, exports, soc = battery_kernel(
+        np.asarray(export_, dtype=np.float64), np.asarray(import_, dtype=np.float64),
+        capacity, charge_power, discharge_power, efficiency_in, efficiency_out
+    )
+    return {'import_': imports, 'export_': exports, 'soc_': soc}
+
+
+def grid_flows(energy_df):
+    #
+    #   import_ / export_ by date (rows of many sources are summed), hours - length of one row
+    #
+    if not energy_df['date'].is_monotonic_increasing or not energy_df['date'].is_unique:
+        energy_df = energy_df.groupby('date')[['import_', 'export_']].sum().reset_index()
+    steps = energy_df['date'].diff().dropna()
+    hours = steps.median() / pd.Timedelta(hours=1) if len(steps.index) else 1.0
+    return energy_df[['date', 'import_', 'export_']], hours
@@ -1,3 +1,6 @@
+import json
+import os
+from collections import OrderedDict
 from datetime import date, timedelta, datetime
 from abc import ABC, abstractmethod
 
@@ -6,9 +9,17 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-from ..subGraphs.my_plots import barplot, lineplot, set_of_speedo, swarmplot, simple_data_preparation
+from ..subGraphs.my_render import RenderScheduler
+from ..subGraphs.my_plots import barplot, heatmap, lineplot, set_of_speedo, swarmplot, simple_data_preparation
 from ..subTools.my_pdf import PDF
+from ..subTools.tools import period_bounds
+from ..subTools.filters import Col, as_filter
+from ..subTools.pandas_tools import filter_and_group_df
+from ..subStorage.my_storage import STORAGE_BACKENDS
 from .my_intrerfaces import LOGIN_INTERFACE
+from .my_rollup import RollupCube
+from .my_tariff import Tariff, settle
+from .my_battery import grid_flows, simulate_battery
 from Energy import get_debug
 
 # LOGIN_INTERFACE = {
@@ -31,6 +42,19 @@ class Energy(ABC):
         ['import_', 0],
         ['direction', 'None']
     ] # basic energy columns
+    RAW_COLUMNS = ['date', 'source'] + [col[0] for col in ENERGY_COLUMNS]  # columns kept in storage
+    SCHEMA = {
+        'source': 'category',
+        'direction': 'category',
+        'day': 'datetime64[ns]',
+        'year': 'category',
+        'month': 'category',
+        'week': 'category',
+        'hour': 'int8',
+        'time': 'int32',  # seconds from midnight, int16 is too small
+    }  # compact types of label columns, energy columns (ending with _) are float64 or float32
+    CALENDAR_COLUMNS = ['day', 'time', 'year', 'month', 'week', 'hour']  # built from date on first use
+    MEMO_SIZE = 128  # memoized aggregations kept (least recently used are dropped)
     
     UNITS = {
         'Wh': 1000,
@@ -46,25 +70,50 @@ class Energy(ABC):
             parent = None,
             export_back = 1,  # back level exported energy
             unit = 'kWh',   # standard energy unit
-            day_batch = 5,  # standard API request daytime
+            day_batch = None,  # API request window in days, None - longest window allowed by source
+            flush_size = 100000,  # rows staged in memory before they are merged into data (derived columns computed)
+            workers = 1,  # parallel API requests
+            cache = None,  # ResponseCache shared by API interfaces
+            storage = 'csv',  # storage backend: csv, parquet, feather, partitioned, hourly, sqlite
+            load_range = None,  # (start, stop) dates read from storage, None - whole history
+            float32 = False,  # energy columns as float32 - half of memory, ~7 significant digits
+            save_png = False,  # report charts written to output_dir as png files too (pdf embeds them from memory)
             owner = 'Piotr Kalista', 
             location = 'ul. Bluszczowa 4c, Kraków',
             refresh = True,
             kWh_cost = 0.65,
             currency = "PLN",
+            tariff = None,  # Tariff (time of use zones, net-metering settlement), None - flat kWh_cost
             login_data = {},
             start_date = None, 
             stop_date = None,
                  ):
         self._energy_df = pd.DataFrame()
+        self._version = 0  # bumped on every data change
+        self._cube = None  # (version, RollupCube)
+        self._memo = OrderedDict()  # (version, aggregation key) -> result
         self.source_name = source_name      
         self.direction = direction
         self.storage_dir = storage_dir
         self.output_dir = output_dir
         self.parent = parent
+        self.dependents = []  # objects calculated from this data (BatteryEnergy), notified with parent
         self.export_back = export_back
         self.unit = unit
         self.day_batch = day_batch
+        self.flush_size = flush_size
+        self.workers = workers
+        self.cache = cache
+        self.storage = storage
+        self.load_range = load_range
+        self.float32 = float32
+        self.save_png = save_png
+        self._dirty_from = None  # first timestamp changed since last save
+        self._lazy_load = None  # postponed storage read (LAZY storage), done on first get_energy
+        self._staged = []  # raw chunks waiting for flush
+        self._staged_rows = 0
+        self._flushed_from = None  # first timestamp merged by flushes since last commit
+        self.watermark = {}  # sync state: last complete timestamp, last partial window
         self.load_data = False  # do wykasowania
         self.start_date = start_date
         self.stop_date = stop_date
@@ -74,15 +123,50 @@ class Energy(ABC):
         self.refresh = refresh
         self.kWh_cost = kWh_cost
         self.currency = currency
+        self.tariff = tariff
         self.login_data = login_data
-        self.interface = LOGIN_INTERFACE[self.source_name] if (self.source_name and self.source_name!="NoName") else None
+        self.interface = LOGIN_INTERFACE.get(self.source_name)  # None - source without API (synthetic, NoName)
         # if type(self)==Energy:
         self.read_data()
 
     def limit_periods(self, period, limit_min, limit_max):
         # trim data to selected periods (min - max)
-        self._energy_df = self._energy_df[(self._energy_df[period]>=limit_min) & (self._energy_df[period]<=limit_max)]
+        start, stop = period_bounds(period, limit_min, limit_max)
+        # own copy - rows out of range are freed (use view() to keep them)
+        self._energy_df = self._energy_df.iloc[self.rows(start, stop)].copy()
+        self.apply_schema(self._energy_df)
+        self._touch(rows_dropped=True)
         self.set_dates()
+        self.notify_parent()
+
+    def rows(self, start=None, stop=None):
+        #
+        #   rows from start to stop (stop excluded): positional slice found by binary search on sorted date,
+        #   boolean mask if frame is not sorted (not aligned CommonEnergy)
+        #
+        temp_df = self.energy_frame([])
+        if temp_df.empty:
+            return slice(0, 0)
+        dates = temp_df['date']
+        start = None if start is None else pd.Timestamp(start)
+        stop = None if stop is None else pd.Timestamp(stop)
+        if dates.is_monotonic_increasing:
+            return slice(
+                0 if start is None else dates.searchsorted(start),
+                len(dates.index) if stop is None else dates.searchsorted(stop)
+            )
+        mask = np.ones(len(dates.index), dtype=bool)
+        if start is not None:
+            mask &= (dates >= start).to_numpy()
+        if stop is not None:
+            mask &= (dates < stop).to_numpy()
+        return mask
+
+    def view(self, start=None, stop=None):
+        '''
+        read-only range start <= date < stop of this object, data is shared (see EnergyView)
+        '''
+        return EnergyView(self, start, stop)
 
     def unit_recalc(self, group_by, columns, agg=["sum"]):
         '''
@@ -90,38 +174,175 @@ class Energy(ABC):
         group_by - grouping list or selected one column
         agg - aggregation type (usually sum)
         '''
-        temp_df = self.get_energy.groupby(group_by)[columns].agg(agg)
-        temp_max = max([temp_df[item].max() for item in  columns ])
-        if temp_max > 10000:
-            unit, multiply = 'MWh', 0.001
-        elif temp_max < 10:
-            unit, multiply = 'Wh', 1000
+        def compute():
+            temp_df = self.get_sum(group_by, agg=agg, columns=columns)
+            temp_max = max([temp_df[item].max() for item in  columns ])
+            if temp_max > 10000:
+                unit, multiply = 'MWh', 0.001
+            elif temp_max < 10:
+                unit, multiply = 'Wh', 1000
+            else:
+                unit, multiply = 'kWh', 1
+            return unit, multiply
+        return self.memo(('unit_recalc', group_by, columns, agg), compute)
+
+    def memo(self, key, compute):
+        #
+        #   LRU cache of aggregations. key starts with data version - results of changed data are never served,
+        #   frames are returned as copies (caller can modify them)
+        #
+        key = self.hashable((self._version,) + tuple(key))
+        if key in self._memo:
+            self._memo.move_to_end(key)
         else:
-            unit, multiply = 'kWh', 1
-        return unit, multiply
-    
-    def get_sum(self, group_by=[], filter_cols=[], filter_values=[], agg='sum'):
-        temp_df = self.get_energy
+            self._memo[key] = compute()
+            if len(self._memo) > self.MEMO_SIZE:
+                self._memo.popitem(last=False)
+        value = self._memo[key]
+        return value.copy() if isinstance(value, (pd.DataFrame, pd.Series)) else value
+
+    @classmethod
+    def hashable(cls, value):
+        if isinstance(value, (list, tuple)):
+            return tuple(cls.hashable(item) for item in value)
+        if isinstance(value, dict):
+            return tuple((key, cls.hashable(item)) for key, item in sorted(value.items()))
+        return value
+
+    def totals(self):
+        # sums of energy columns and number of timestamps (count), data not loaded yet - summed by storage
+        def compute():
+            temp_df = self.stored_aggregate([], count=True) if self._lazy_load is not None else None
+            if temp_df is not None:
+                return temp_df.iloc[0]
+            temp_df = self.energy_frame([])
+            totals = temp_df[[col for col in temp_df.columns if col.endswith('_')]].sum()
+            totals['count'] = temp_df['date'].count()
+            return totals
+        return self.memo(('totals',), compute)
+
+    def get_sum(self, group_by=[], filter_cols=[], filter_values=[], agg='sum', columns=None, filter=None):
+        #
+        #   filter - Filter expression (or legacy filter dict) applied before grouping
+        #
+        filter = as_filter(filter)
+        return self.memo(
+            ('get_sum', group_by, filter_cols, filter_values, agg, columns, filter.key if filter else None),
+            lambda: self._get_sum(group_by, filter_cols, filter_values, agg, columns, filter)
+        )
+
+    def _get_sum(self, group_by=[], filter_cols=[], filter_values=[], agg='sum', columns=None, filter=None):
+        unfiltered = not filter_cols and filter is None
+        if group_by and unfiltered and self._lazy_load is None:
+            cube = self.rollup
+            if cube is not None and cube.has(group_by, agg, columns):
+                return cube.get(group_by, agg, columns)
+        if group_by and unfiltered:
+            temp_df = self.stored_aggregate(group_by, agg)
+            if temp_df is not None:
+                return temp_df if columns is None else temp_df[self.group_list(group_by) + columns]
+        filter_columns = list(filter_cols) + (filter.columns() if filter else [])
+        temp_df = self.energy_frame(self.group_list(group_by) + filter_columns) if group_by else self.get_energy
+        if filter:
+            temp_df = temp_df[self.mask(filter)]
         if filter_cols:
             temp_df = temp_df[temp_df[filter_cols].isin(filter_values)]
         if group_by:
-            temp_df = temp_df.groupby(group_by).aggregate(agg)
+            temp_df = temp_df.groupby(group_by)
+            temp_df = temp_df.aggregate(agg) if columns is None else temp_df[columns].aggregate(agg)
             temp_df = temp_df.reset_index()
         else:
             temp_df = temp_df.aggregate(agg)
             temp_df['direction'] = self.direction
         return temp_df
 
+    def mask(self, filter):
+        #
+        #   boolean row mask of filter (Filter or legacy dict), computed once per data version
+        #
+        filter = as_filter(filter)
+        return self.memo(('mask', filter.key), lambda: filter.mask(self.energy_frame(filter.columns())))
+
+    def stored_aggregate(self, group_by, agg='sum', count=False):
+        #
+        #   group query pushed down to storage (sqlite), data is not loaded to pandas.
+        #   used while data is not loaded (LAZY storage): get_sum, totals, unit_recalc.
+        #   None - storage can't run it or data in memory differs from stored data
+        #
+        store = self.store
+        group_by = self.group_list(group_by)
+        if (
+            not hasattr(store, 'aggregate') or agg not in ('sum', 'mean')
+            or not all(key in store.GROUP_KEYS for key in group_by) or self._dirty_from is not None
+        ):
+            return None
+        if self._lazy_load is not None:
+            date_range = self.load_range or ()
+        elif not self._energy_df.empty:
+            date_range = (self.start_date, self.stop_date + timedelta(seconds=1))
+        else:
+            return None
+        if not store.exists():
+            return None
+        temp_df = store.aggregate(group_by, agg, *date_range, count=count)
+        # derived columns are linear - sum / mean of them is calculated from aggregated energy columns
+        self.calc_derived_columns(temp_df)
+        return temp_df
+
+    @staticmethod
+    def group_list(group_by):
+        return [group_by] if isinstance(group_by, str) else list(group_by)
+
+    @property
+    def rollup(self):
+        #
+        #   RollupCube of energy columns, built once per data version (None - no data)
+        #
+        if self._cube is None or self._cube[0] != self._version:
+            temp_df = self.energy_frame([])
+            if temp_df.empty:
+                return None
+            columns = [col for col in temp_df.columns if col.endswith('_')]
+            self._cube = (self._version, RollupCube(temp_df, columns, self.calendar_columns))
+        return self._cube[1]
+
+    def plot_frame(self, group_by, agg='sum', columns=None):
+        #
+        #   raw frame for plots - calendar columns are built only when rollup cube can't serve group_by,
+        #   cube serves it - no rows (chart data is taken from cube, small to send to render process)
+        #
+        cube = self.rollup
+        if cube is not None and cube.has(group_by, agg, columns):
+            return self.energy_frame([]).iloc[:0]
+        return self.energy_frame(self.group_list(group_by))
+
+    def chart(self, render, function, *args, **kwargs):
+        #
+        #   render - RenderScheduler (chart rendered in process pool), PDF (rendered now, png kept in pdf memory)
+        #   or None (rendered now). returns png buffer, None - chart is scheduled
+        #
+        kwargs.setdefault('save_png', self.save_png)
+        if isinstance(render, RenderScheduler):
+            return render.submit(function, *args, **kwargs)
+        buffer = function(*args, **kwargs)
+        if render is not None and buffer is not None:
+            render.add_png(kwargs['filename'] + '.png', buffer)
+        return buffer
+
     def daily_flash_page(self, 
         filename='daily_flash',
         pdf=None,
+        render=None,
     ):
-        out_columns = [col for col in self.get_energy.columns if col.endswith("_")]
-        by_day_df = self.get_energy[['day'] + out_columns].groupby('day').sum().reset_index()
+        cube = self.rollup
+        energy_df = self.energy_frame([])
+        out_columns = [col for col in energy_df.columns if col.endswith("_")]
+        by_day_df = cube.get('day', 'sum', out_columns)
         stat_df = by_day_df[out_columns].agg(['min', 'max', 'mean']).T.reset_index()
         stat_df = stat_df[stat_df['mean']>0]
-        set_of_speedo(stat_df, self.output_dir + '{}_speedo_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
-        if self.debug:
+        render = render or pdf  # rendered now - charts are kept in pdf memory
+        self.chart(render, set_of_speedo, stat_df, filename=self.output_dir + '{}_speedo_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
+        if self.debug and self.save_png:
             print('saved png file: ', end="")
             print(self.output_dir + '{}_speedo_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
         if pdf:
@@ -150,13 +371,13 @@ class Energy(ABC):
         mean=True 
         ax=None
         figsize=(6, 3)
-        lineplot(self.get_energy, group_by, columns, 
+        self.chart(render, lineplot, self.plot_frame(group_by, agg, columns), group_by, columns, 
             colors=colors, fill=fill, agg=agg, 
             filter=filter, unit=unit, fill_between=fill_between,
             filename=filename_g, mean=mean, title = title, 
-            figsize=figsize, ax=ax
+            figsize=figsize, ax=ax, cube=cube
         )
-        if self.debug:
+        if self.debug and self.save_png:
             print('saved png file: ', end="")
             print(filename_g)
         if pdf:
@@ -165,13 +386,13 @@ class Energy(ABC):
         title = 'max Import and Total Consumption energy by hour a day'
         fill_between = ''
         filename_g=self.output_dir + '{}_byHour_2_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
-        lineplot(self.get_energy, group_by, columns, 
+        self.chart(render, lineplot, self.plot_frame(group_by, agg, columns), group_by, columns, 
             colors=colors, fill=fill, agg=agg, 
             filter=filter, unit=unit,  
             filename=filename_g, mean=mean, title = title, 
-            figsize=figsize, ax=ax
+            figsize=figsize, ax=ax, cube=cube
         )
-        if self.debug:
+        if self.debug and self.save_png:
             print('saved png file: ', end="")
             print(filename_g)
         if pdf:
@@ -183,9 +404,10 @@ class Energy(ABC):
             agg='sum',
             filename=filename_g,
             figsize=figsize, 
-            title="daily distribution by category"
+            title="daily distribution by category",
+            render=render
         )
-        if self.debug:
+        if self.debug and self.save_png:
             print('saved png file: ', end="")
             print(filename_g)
         if pdf:
@@ -196,13 +418,18 @@ class Energy(ABC):
         group_by='day',
         table_include=False,
         pdf=None,
+        render=None,
     ):
-        out_columns = [col for col in self.get_energy.columns if col.endswith("_") and (self.get_energy[col].min()!=0 or self.get_energy[col].max()!=0 )]
         group_by = group_by.split("(")[0]
+        render = render or pdf  # rendered now - charts are kept in pdf memory
+        cube = self.rollup
+        energy_df = self.plot_frame(group_by)
+        col_min, col_max = cube.total('min'), cube.total('max')
+        out_columns = [col for col in cube.columns if col_min[col]!=0 or col_max[col]!=0]
         unit, multiply = self.unit_recalc(group_by, out_columns, 'sum')
         if table_include:
-            table_df = simple_data_preparation(self.get_energy, group_by=group_by, series_to_plot=out_columns,unit=self.unit)[0]
-            table_df_avg = table_df.mean()
+            table_df = simple_data_preparation(energy_df, group_by=group_by, series_to_plot=out_columns,unit=self.unit, cube=cube)[0]
+            table_df_avg = table_df[out_columns].mean()
             table_df_avg = {col: table_df_avg[col] for col in out_columns}
             table_df_avg[group_by] = 'mean'
             table_df = table_df.append(table_df_avg, ignore_index=True)
@@ -234,8 +461,9 @@ class Energy(ABC):
                         fill_cell = 0
                         
                     pdf.cell(5)
-                    if str(table_df.iloc[row][group_by]) == "mean": fill_cell = 1
-                    pdf.cell(40,5, str(table_df.iloc[row][group_by]) , 1, 0, 'C', fill_cell)
+                    label = table_df.iloc[row][group_by]
+                    if str(label) == "mean": fill_cell = 1
+                    pdf.cell(40,5, '{:%Y/%m/%d}'.format(label) if isinstance(label, pd.Timestamp) else str(label) , 1, 0, 'C', fill_cell)
                     for idx, col in enumerate(temp_col[1:]):
                         if idx % 2 == 0:
                             pdf.cell(12,5, '{:,.2f}'.format(multiply * table_df.iloc[row][col]).replace(',', ' ') , 1, 0, 'C', fill_cell)
@@ -259,7 +487,8 @@ class Energy(ABC):
             filename=filename_g, 
             agg="sum", 
             mean=False, 
-            ax=None
+            ax=None,
+            render=render
         )
         filename_g = self.output_dir + '{}_b2_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
         self.basic_barplot( 
@@ -269,7 +498,8 @@ class Energy(ABC):
             filename=filename_g, 
             agg="sum", 
             mean=False, 
-            ax=None
+            ax=None,
+            render=render
         )
         filename_g = self.output_dir + '{}_b3_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
         self.basic_barplot( 
@@ -279,7 +509,8 @@ class Energy(ABC):
             filename=filename_g, 
             agg="sum", 
             mean=False, 
-            ax=None
+            ax=None,
+            render=render
         )
         if pdf:
             pdf.add_page()
@@ -296,38 +527,12 @@ class Energy(ABC):
             pdf.cell(0, 5, 'summary energy balance / PV production (by {}).'.format(group_by), 0, 1, 'C')
             filename_g = self.output_dir + '{}_b3_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
             pdf.image(filename_g + '.png', None, None, 150, 75, type='PNG')
-        if self.debug:
+        if self.debug and self.save_png:
                 print('saved png files: ')
                 print("   " + self.output_dir + '{}_b1_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
                 print("   " + self.output_dir + '{}_b2_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
                 print("   " + self.output_dir + '{}_b3_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
         filename_g = self.output_dir + '{}_l1_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
-        filter_day = {
-            'od 8 rano': {
-                'Column': 'hour',
-                'Condition': '>=',
-                "Value": 8,
-            },
-            'do 20 wieczorem': {
-                'Column': 'hour',
-                'Condition': '<',
-                "Value": 20,
-                'logic_between': "and"
-            },
-        }
-        filter_night = {
-            'od 8 rano': {
-                'Column': 'hour',
-                'Condition': '<',
-                "Value": 8,
-            },
-            'do 20 wieczorem': {
-                'Column': 'hour',
-                'Condition': '>=',
-                "Value": 20,
-                'logic_between': "and"
-            },
-        }
         self.basic_lineplot(
             group_by=group_by, 
             columns=['production_', 'import_', 'export_', ], 
@@ -336,7 +541,8 @@ class Energy(ABC):
             filename=filename_g, 
             agg="sum", 
             mean=False, 
-            ax=None
+            ax=None,
+            render=render
         )
         filename_g = self.output_dir + '{}_l2_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
         self.basic_lineplot(
@@ -347,7 +553,17 @@ class Energy(ABC):
             filename=filename_g, 
             agg="sum", 
             mean=False, 
-            ax=None
+            ax=None,
+            render=render
+        )
+        filename_g = self.output_dir + '{}_l3_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
+        filter_day = (Col('hour') >= 8) & (Col('hour') < 20)  # od 8 rano do 20 wieczorem
+        self.day_night_lineplot(
+            group_by=group_by, 
+            columns=['import_', 'export_'], 
+            day=filter_day, 
+            filename=filename_g, 
+            render=render
         )
         filename_g = self.output_dir + '{}_sw1_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
         self.basic_swarmplot(
@@ -355,7 +571,8 @@ class Energy(ABC):
             out_columns,
             agg='sum',
             filename=filename_g,
-            dotsize=5
+            dotsize=5,
+            render=render
         )
         if pdf:
             pdf.add_page()
@@ -372,10 +589,19 @@ class Energy(ABC):
             pdf.cell(0, 5, 'distribution per category (by {}).'.format(group_by), 0, 1, 'C')
             filename_g = self.output_dir + '{}_sw1_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
             pdf.image(filename_g + '.png', None, None, 150, 75, type='PNG')
-        if self.debug:
+            pdf.add_page()
+            pdf.set_font('Lato', 'B', 12)
+            pdf.cell(0, 10, ' day / night reports. Period {:%Y/%m/%d}-{:%Y/%m/%d}. export back: {:.1%}, cost {:.2f} {}/{} '.format(
+                self.start_date, self.stop_date, self.export_back, self.kWh_cost, self.currency, self.unit) , 0, 1, 'C')
+            pdf.set_font('Lato', 'B', 8)
+            pdf.cell(0, 5, 'import, export energy in day (8-20) and night hours (by {}).'.format(group_by), 0, 1, 'C')
+            filename_g = self.output_dir + '{}_l3_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date)
+            pdf.image(filename_g + '.png', None, None, 150, 75, type='PNG')
+        if self.debug and self.save_png:
                 print('saved png files: ')
                 print("   " + self.output_dir + '{}_l1_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
                 print("   " + self.output_dir + '{}_l2_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
+                print("   " + self.output_dir + '{}_l3_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
                 print("   " + self.output_dir + '{}_sw3_({:%Y%m%d}-{:%Y%m%d})'.format(filename, self.start_date, self.stop_date))
                 
     def basic_barplot(self, 
@@ -386,11 +612,12 @@ class Energy(ABC):
         filename='', 
         mean=False, 
         ax=None,
+        render=None,
         **kwargs
     ):
         unit, multiply = self.unit_recalc(group_by, columns, agg)
-        return barplot(self.get_energy, group_by, columns,colors, agg, unit=unit, 
-                       multiply=multiply, filename=filename, mean=mean, ax=ax, **kwargs)
+        return self.chart(render, barplot, self.plot_frame(group_by, agg, columns), group_by, columns,colors, agg, unit=unit, 
+                       multiply=multiply, filename=filename, mean=mean, ax=ax, cube=self.rollup, **kwargs)
 
     def basic_swarmplot(self, 
         group_by='day', 
@@ -401,11 +628,12 @@ class Energy(ABC):
         mean=False, 
         ax=None,
         dotsize=2,
+        render=None,
         **kwargs
     ):
         unit, multiply = self.unit_recalc(group_by, columns, agg)
-        return swarmplot(self.get_energy, group_by, columns,colors=colors, agg=agg, 
-                         unit=unit, multiply=multiply, filename=filename, mean=mean, dotsize=dotsize, ax=ax, **kwargs)
+        return self.chart(render, swarmplot, self.plot_frame(group_by, agg, columns), group_by, columns,colors=colors, agg=agg, 
+                         unit=unit, multiply=multiply, filename=filename, mean=mean, dotsize=dotsize, ax=ax, cube=self.rollup, **kwargs)
 
     def basic_lineplot(self, 
         group_by='day', 
@@ -417,12 +645,36 @@ class Energy(ABC):
         filter='', 
         mean=False, 
         ax=None,
+        render=None,
         **kwargs
     ):
         unit, multiply = self.unit_recalc(group_by, columns, agg)
         
-        return lineplot(self.get_energy, group_by, columns, colors=colors, 
-                        fill=fill, agg=agg, filter=filter, unit=unit, multiply=multiply, filename=filename, mean=mean, ax=ax, **kwargs)
+        return self.chart(render, lineplot, self.plot_frame(group_by, agg, columns), group_by, columns, colors=colors, 
+                        fill=fill, agg=agg, filter=filter, unit=unit, multiply=multiply, filename=filename, mean=mean, ax=ax, cube=self.rollup, **kwargs)
+
+    def day_night_lineplot(self, 
+        group_by='day', 
+        columns=['import_', 'export_'], 
+        day=(Col('hour') >= 8) & (Col('hour') < 20), 
+        colors=[], 
+        filename='', 
+        agg="sum", 
+        ax=None,
+        render=None,
+        **kwargs
+    ):
+        #
+        #   columns aggregated separately in day hours (day filter) and night hours (~day): import_day_, import_night_
+        #
+        unit, multiply = self.unit_recalc(group_by, columns, agg)
+        temp_df = pd.concat([
+            self.get_sum(group_by, agg=agg, columns=columns, filter=hours).set_index(group_by).add_suffix(name + '_')
+            for name, hours in [('day', day), ('night', ~day)]
+        ], axis=1).fillna(0).reset_index()
+        series = [col + name + '_' for col in columns for name in ['day', 'night']]
+        return self.chart(render, lineplot, temp_df, group_by, series, colors=colors, fill=[], agg=agg, 
+                        unit=unit, multiply=multiply, filename=filename, mean=False, ax=ax, **kwargs)
     
     def create_pdf_report(self, 
         group_by, 
@@ -432,8 +684,11 @@ class Energy(ABC):
         agg='sum',
         add_avg=''
     ):
+        filter = as_filter(filter)
         if filter or group_by:
-            temp_df, filter_name = filter_and_group_df(self.get_energy, filter, group_by, agg, add_avg)
+            temp_df, filter_name = filter_and_group_df(
+                self.get_energy, filter, group_by, agg, add_avg, mask=self.mask(filter) if filter else None
+            )
         else:
             temp_df = self.get_energy
             filter_name= ''
@@ -443,31 +698,67 @@ class Energy(ABC):
     
     @property
     def direction_list(self):
-        return list(set(self.get_energy['direction']))
+        return list(set(self.energy_frame([])['direction']))
 
     @property
     def storage_file(self):
-        return '{}{}.{}'.format(self.storage_dir, self.source_name, 'csv')
+        return self.store.path
+
+    @property
+    def store(self):
+        return STORAGE_BACKENDS[self.storage](self.storage_dir, self.source_name)
     
     # @property
     # def energy_df(self):
     #     return self.energy_df()
     
-    def load_from_file(self):
-        try:
-            self.add_df(pd.read_csv(self.storage_file, index_col=0, parse_dates=["date"]))
-        except FileNotFoundError as E:
+    def load_from_file(self, columns=None):
+        #
+        #   columns - projection of RAW_COLUMNS, derived columns are recalculated
+        #
+        #   load_range - only rows (partitioned store: only months) from start to stop are read
+        #
+        store = self.store
+        legacy_store = STORAGE_BACKENDS['csv'](self.storage_dir, self.source_name)
+        if not store.exists() and legacy_store.exists():
+            # data saved in csv before storage backend was changed - converted once, derived columns are dropped
+            store.save(legacy_store.load(self.RAW_COLUMNS))
+        if not store.exists():
             raise FileNotFoundError("brak pliku '{}' z danymi historycznymi".format(self.storage_file))
+        if store.LAZY:
+            self._lazy_load = lambda: store.load(columns or self.RAW_COLUMNS, *(self.load_range or ()))
+        else:
+            self.add_df(store.load(columns or self.RAW_COLUMNS, *(self.load_range or ())))
 
     def drop_last_day(self):
-        last_day = self._energy_df.day.max()
+        # last (incomplete) day is removed, returns its date - first day to fetch again
+        last_day = self.energy_frame(['day']).day.max()
         self._energy_df = self._energy_df.drop(
                 self._energy_df[self._energy_df['day']==last_day].index, axis=0
             )
-        return last_day
+        self.apply_schema(self._energy_df)
+        self._touch(rows_dropped=True)
+        self.notify_parent(last_day)
+        return last_day.date()
     
     def save_to_file(self):
-        self._energy_df.to_csv(self.storage_file)
+        #
+        #   incremental store or range limited data - only rows changed since last save are upserted,
+        #   otherwise whole history is rewritten
+        #
+        store = self.store
+        if (store.INCREMENTAL or self.load_range) and store.exists():
+            if self._dirty_from is not None:
+                raw_df = self.raw_energy
+                store.upsert(raw_df.iloc[raw_df['date'].searchsorted(self._dirty_from):])
+        else:
+            store.save(self.raw_energy)
+        self._dirty_from = None
+
+    @property
+    def raw_energy(self):
+        temp_df = self.energy_frame([])
+        return temp_df[[col for col in self.RAW_COLUMNS if col in temp_df.columns]]
 
     def str_head(self):
         return ''
@@ -476,13 +767,168 @@ class Energy(ABC):
         output = """
         total savings in currency: {:>16,.2f} {}
         total costs in currency:   {:>16,.2f} {}
-        """.format(
-            (self.get_energy['self_consumption_'].sum() + self.get_energy['export_'].sum() * self.export_back) * self.kWh_cost,
+        """
+        if self.tariff is not None:
+            return self.tariff_output()
+        if self.kWh_cost <= 0:
+            return ''
+        totals = self.totals()
+        return output.format(
+            (totals['self_consumption_'] + totals['export_'] * self.export_back) * self.kWh_cost,
             self.currency,
-            self.get_energy['import_'].sum() * self.kWh_cost,
+            totals['import_'] * self.kWh_cost,
             self.currency
-        ) if self.kWh_cost > 0 else ''
+        )
         return output
+
+    def tariff_output(self):
+        output = """
+        tariff:                    {:>16}
+        costs without PV:          {:>16,.2f} {}
+        net-metering costs:        {:>16,.2f} {}
+        total savings in currency: {:>16,.2f} {}
+        banked / expired energy:   {:>16,.2f} / {:,.2f} {}
+        """
+        temp_df = self.settlement()
+        return output.format(
+            self.tariff.name,
+            temp_df['base_cost'].sum(), self.currency,
+            temp_df['cost'].sum(), self.currency,
+            temp_df['base_cost'].sum() - temp_df['cost'].sum(), self.currency,
+            temp_df['banked_'].sum(), temp_df['expired_'].sum(), self.unit,
+        )
+
+    def settlement(self, tariff=None, export_back=None):
+        #
+        #   hourly net-metering settlement of import / export (see my_tariff.settle),
+        #   base_cost - cost of total consumption without PV. tariff None - self.tariff or flat kWh_cost
+        #
+        tariff = tariff or self.tariff or Tariff.single(self.kWh_cost)
+        export_back = self.export_back if export_back is None else export_back
+        def compute():
+            temp_df = self.energy_frame([])
+            columns = ['import_', 'export_', 'total_consumption_']
+            if not temp_df['date'].is_monotonic_increasing or not temp_df['date'].is_unique:
+                # rows of many sources (not aligned CommonEnergy)
+                temp_df = temp_df.groupby('date')[columns].sum().reset_index()
+            result = settle(temp_df['date'], temp_df['import_'], temp_df['export_'], tariff, export_back)
+            result['base_cost'] = temp_df['total_consumption_'].to_numpy() * result['price'].to_numpy()
+            return result
+        return self.memo(('settlement', tariff.key, export_back), compute)
+
+    def sweep(self, export_back=None, kWh_cost=None, group_by=None):
+        '''
+        savings and costs (as in saving_output) for every export_back x kWh_cost pair.
+        energy is aggregated once (memo), grid is one numpy broadcast: 10 000 pairs cost as much as one.
+        tariff set - net-metering settlement of tariff (as tariff_output), one per export_back,
+        kWh_cost is price of first tariff zone (prices of all zones are scaled with it)
+        group_by - result by period too (e.g. month)
+        returns tidy frame: [group_by], export_back, kWh_cost, savings, costs, balance (savings - costs)
+        '''
+        export_back = np.atleast_1d(np.asarray(self.export_back if export_back is None else export_back, dtype=np.float64))
+        if self.tariff is not None:
+            kWh_cost = self.tariff.prices[0] if kWh_cost is None else kWh_cost
+            return self.tariff_sweep(export_back, np.atleast_1d(np.asarray(kWh_cost, dtype=np.float64)), group_by)
+        kWh_cost = np.atleast_1d(np.asarray(self.kWh_cost if kWh_cost is None else kWh_cost, dtype=np.float64))
+        columns = ['self_consumption_', 'export_', 'import_']
+        if group_by:
+            sums = self.get_sum(group_by, agg='sum', columns=columns)
+            keys = sums[self.group_list(group_by)]
+        else:
+            sums = self.totals()[columns].to_frame().T
+            keys = pd.DataFrame(index=sums.index)
+        # shape: groups x export_back x kWh_cost
+        self_consumption, export, import_ = [sums[col].to_numpy()[:, None, None] for col in columns]
+        back, cost = export_back[None, :, None], kWh_cost[None, None, :]
+        savings = (self_consumption + export * back) * cost
+        costs = np.broadcast_to(import_ * cost, savings.shape)
+        return self.sweep_frame(keys, export_back, kWh_cost, savings, costs)
+
+    def tariff_sweep(self, export_back, kWh_cost, group_by=None):
+        #
+        #   sweep of tariff: energy banked / paid depends on export_back (settlement of every value, memo),
+        #   costs are linear in prices - scaled for kWh_cost grid
+        #
+        base, paid = [], []
+        for back in export_back:
+            temp_df = self.settlement(self.tariff, back)[['base_cost', 'cost']]
+            if group_by:
+                group_list = self.group_list(group_by)
+                labels = self.calendar_columns(pd.Series(temp_df.index), group_list)
+                temp_df = temp_df.groupby([labels[col].to_numpy() for col in group_list]).sum()
+                temp_df.index.names = group_list
+            else:
+                temp_df = temp_df.sum().to_frame().T
+            base.append(temp_df['base_cost'].to_numpy())
+            paid.append(temp_df['cost'].to_numpy())
+        keys = temp_df.index.to_frame(index=False) if group_by else pd.DataFrame(index=temp_df.index)
+        # shape: groups x export_back x kWh_cost
+        scale = (kWh_cost / self.tariff.prices[0])[None, None, :]
+        costs = np.stack(paid, axis=1)[:, :, None] * scale
+        savings = np.stack(base, axis=1)[:, :, None] * scale - costs
+        return self.sweep_frame(keys, export_back, kWh_cost, savings, costs)
+
+    @staticmethod
+    def sweep_frame(keys, export_back, kWh_cost, savings, costs):
+        # tidy frame of groups x export_back x kWh_cost arrays
+        back, cost = export_back[None, :, None], kWh_cost[None, None, :]
+        shape = savings.shape
+        temp_df = keys.iloc[np.repeat(np.arange(shape[0]), shape[1] * shape[2])].reset_index(drop=True)
+        temp_df['export_back'] = np.broadcast_to(back, shape).ravel()
+        temp_df['kWh_cost'] = np.broadcast_to(cost, shape).ravel()
+        temp_df['savings'] = savings.ravel()
+        temp_df['costs'] = costs.ravel()
+        temp_df['balance'] = temp_df['savings'] - temp_df['costs']
+        return temp_df
+
+    def battery_sweep(self, capacity, charge_power=None, discharge_power=None, efficiency=0.9):
+        '''
+        what batteries of given capacities [kWh] would change (see my_battery.simulate_battery),
+        all sizes are simulated in one pass over hours.
+        returns frame by capacity: import_, export_ with battery, import_saved_, export_lost_, savings (flat kWh_cost)
+        '''
+        temp_df, hours = grid_flows(self.energy_frame([]))
+        capacity = np.atleast_1d(np.asarray(capacity, dtype=np.float64))
+        result = simulate_battery(
+            temp_df['import_'], temp_df['export_'], capacity, charge_power, discharge_power, efficiency, hours
+        )
+        result_df = pd.DataFrame({
+            'capacity': capacity,
+            'import_': result['import_'].sum(axis=0),
+            'export_': result['export_'].sum(axis=0),
+        })
+        result_df['import_saved_'] = temp_df['import_'].sum() - result_df['import_']
+        result_df['export_lost_'] = temp_df['export_'].sum() - result_df['export_']
+        result_df['savings'] = (result_df['import_saved_'] - result_df['export_lost_'] * self.export_back) * self.kWh_cost
+        return result_df
+
+    def sweep_page(self, 
+        pdf,
+        export_back=np.linspace(0, 1, 101),
+        kWh_cost=np.linspace(0.2, 1.2, 101),
+        filename='sweep',
+        render=None,
+    ):
+        #
+        #   heatmaps of savings and balance over export_back x kWh_cost grid
+        #
+        temp_df = self.sweep(export_back, kWh_cost)
+        render = render or pdf  # rendered now - charts are kept in pdf memory
+        for value in ['savings', 'balance']:
+            filename_g = self.output_dir + '{}_{}_({:%Y%m%d}-{:%Y%m%d})'.format(filename, value, self.start_date, self.stop_date)
+            self.chart(render, heatmap, temp_df, 'export_back', 'kWh_cost', value, unit=self.currency, filename=filename_g)
+        pdf.add_page()
+        pdf.set_font('Lato', 'B', 12)
+        pdf.cell(0, 10, ' contract scenarios. Period {:%Y/%m/%d}-{:%Y/%m/%d}. {} combinations of export back and kWh cost'.format(
+            self.start_date, self.stop_date, len(temp_df.index)), 0, 1, 'C')
+        pdf.set_font('Lato', 'B', 8)
+        # tariff - kWh cost is price of first zone
+        kWh_cost = self.kWh_cost if self.tariff is None else self.tariff.prices[0]
+        for value, description in [('savings', 'total savings'), ('balance', 'savings - costs')]:
+            pdf.cell(0, 5, '{} in {} (current: export back {:.2f}, cost {:.2f} {}/{}).'.format(
+                description, self.currency, self.export_back, kWh_cost, self.currency, self.unit), 0, 1, 'C')
+            filename_g = self.output_dir + '{}_{}_({:%Y%m%d}-{:%Y%m%d})'.format(filename, value, self.start_date, self.stop_date)
+            pdf.image(filename_g + '.png', None, None, 150, 75, type='PNG')
     
     def __str__(self) -> str:
         output = """
@@ -504,93 +950,298 @@ class Energy(ABC):
          ----------------------------------------------------------------------------------------------------------------------------
         """
 
+        self.energy_frame([])  # dates of data (LAZY storage - loaded now)
         days = (self.stop_date - self.start_date).days
+        totals = self.totals()
         return output.format(
             self.source_name,
             self.direction,
             self.start_date,
             self.stop_date,
-            self.get_energy.date.count(),
+            int(totals['count']),
             self.export_back,
             days,
             self.kWh_cost, self.currency,
-            self.get_energy['import_'].sum(),
-            self.get_energy['export_'].sum(),
-            self.get_energy['production_'].sum(),
-            self.get_energy['balance_'].sum(), 
-            self.get_energy['self_consumption_'].sum(),
-            self.get_energy['total_consumption_'].sum(), 
-            self.get_energy['import_'].sum() / days,
-            self.get_energy['export_'].sum() / days,
-            self.get_energy['production_'].sum() / days,
-            self.get_energy['balance_'].sum() / days,
-            self.get_energy['self_consumption_'].sum() / days,
-            self.get_energy['total_consumption_'].sum() / days,
+            totals['import_'],
+            totals['export_'],
+            totals['production_'],
+            totals['balance_'],
+            totals['self_consumption_'],
+            totals['total_consumption_'],
+            totals['import_'] / days,
+            totals['export_'] / days,
+            totals['production_'] / days,
+            totals['balance_'] / days,
+            totals['self_consumption_'] / days,
+            totals['total_consumption_'] / days,
         ) + self.saving_output()
 
     
     def read_data(self):
-        start_date = self.start_date
         try:
             self.load_from_file()
-            start_date = self.drop_last_day()
         except FileNotFoundError as E:
             print("!!!!!!\n{} - no historical data".format(self.source_name))
+        self.read_watermark()
         if not self.refresh:
             self.debug_import_msg()
             return
-        with self.interface(self.login_data, start_date, self.day_batch, self.UNITS) as connection:
+        self.check_watermark()
+        self.recover_checkpoints()  # saved and cleared with fetched data below
+        start_date = self.sync_start()
+        with self.interface(
+            self.login_data, start_date, self.day_batch, self.UNITS, self.workers, self.cache, first_date=self.start_date
+        ) as connection:
+            if self.debug:
+                print('{} - planned API calls: {}'.format(self.source_name, connection.planned_calls))
             for temp_df in connection.get_dataset():
-                self.append_df(temp_df)
+                self.checkpoint_df(temp_df)
+                self.stage_df(temp_df)
+        self.commit_staged()
         self.save_to_file()
+        self.set_watermark()
+        self.write_watermark()
+        self.clear_checkpoints()
         self.debug_import_msg()
 
-    def refresh__energy_df(self):
+    @property
+    def watermark_file(self):
+        return '{}{}.meta.json'.format(self.storage_dir, self.source_name)
+
+    def read_watermark(self):
+        try:
+            with open(self.watermark_file, 'r') as file:
+                self.watermark = json.load(file)
+        except FileNotFoundError:
+            # data saved before watermarks were kept
+            self.set_watermark()
+
+    def check_watermark(self):
+        #
+        #   watermark is valid only with data it was set on: lost data file or new (empty) storage backend
+        #   - whole history is fetched again, watermark newer than stored data - set again from data.
+        #   compared with last stored timestamp - loaded rows (load_range) can end before it
+        #
+        last_date = self.store.last_date()
+        if last_date is None:
+            self.watermark = {}
+            return
+        marks = [self.watermark.get('last_complete')] + (self.watermark.get('partial_window') or [])
+        if any(pd.Timestamp(mark) > last_date for mark in marks if mark):
+            print("!!!!!!\n{} - sync state newer than stored data, ignored".format(self.source_name))
+            self.set_watermark()
+
+    def write_watermark(self):
+        with open(self.watermark_file + '.tmp', 'w') as file:
+            json.dump(self.watermark, file)
+        os.replace(self.watermark_file + '.tmp', self.watermark_file)
+
+    def set_watermark(self):
+        #
+        #   last stored day (and today) can be incomplete - kept as partial window, refetched by next sync.
+        #   data is sorted by date, only the tail is read
+        #
+        dates = self.tail_dates()
+        if dates is None:
+            self.watermark = {}
+            return
+        last_date = dates.iloc[-1]
+        partial_from = min(last_date.normalize(), pd.Timestamp(date.today()))
+        complete = dates.searchsorted(partial_from) - 1
+        self.watermark = {
+            'last_complete': dates.iloc[complete].isoformat() if complete >= 0 else None,
+            'partial_window': [partial_from.isoformat(), last_date.isoformat()],
+        }
+
+    def tail_dates(self):
+        #
+        #   sorted dates ending with last known timestamp (None - no data): loaded data, with load_range
+        #   last two stored days (loaded rows have gap after range), unless loaded rows are newer (not saved yet).
+        #   data not loaded yet (LAZY storage) - stored days, data is not loaded for it
+        #
+        lazy = self._lazy_load is not None
+        temp_df = self._energy_df if lazy else self.energy_frame([])
+        last_date = self.store.last_date() if self.load_range or lazy else None
+        if last_date is not None and (temp_df.empty or temp_df['date'].iloc[-1] <= last_date):
+            return self.store.load(['date'], last_date.normalize() - timedelta(days=1))['date']
+        return temp_df['date'] if not temp_df.empty else None
+
+    def sync_start(self):
+        # first day to fetch
+        if self.watermark.get('partial_window'):
+            return datetime.fromisoformat(self.watermark['partial_window'][0]).date()
+        if self.watermark.get('last_complete'):
+            return datetime.fromisoformat(self.watermark['last_complete']).date() + timedelta(days=1)
+        return self.start_date
+
+    @property
+    def checkpoint_dir(self):
+        return '{}{}.journal/'.format(self.storage_dir, self.source_name)
+
+    def checkpoint_df(self, temp_df):
+        #
+        #   persist raw fetched window (atomic write), interrupted refresh resumes from it
+        #
+        if temp_df.empty:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        filename = self.checkpoint_dir + '{:%Y%m%d%H%M}-{:%Y%m%d%H%M}.csv'.format(temp_df.date.min(), temp_df.date.max())
+        temp_df.to_csv(filename + '.tmp', index=False)
+        os.replace(filename + '.tmp', filename)
+
+    def recover_checkpoints(self):
+        #
+        #   add windows fetched by interrupted refresh
+        #
+        if not os.path.isdir(self.checkpoint_dir):
+            return
+        files = sorted(f for f in os.listdir(self.checkpoint_dir) if f.endswith('.csv'))
+        if not files:
+            return
+        for file in files:
+            self.stage_df(pd.read_csv(self.checkpoint_dir + file, parse_dates=['date']))
+        self.commit_staged()
+        self.set_watermark()
+        print("!!!!!!\n{} - resumed after {} saved windows".format(self.source_name, len(files)))
+
+    def clear_checkpoints(self):
+        if not os.path.isdir(self.checkpoint_dir):
+            return
+        for file in os.listdir(self.checkpoint_dir):
+            os.remove(self.checkpoint_dir + file)
+        os.rmdir(self.checkpoint_dir)
+
+    def refresh__energy_df(self, sub_energy=None, since=None):
         pass
+
+    def notify_parent(self, since=None):
+        # parent merges data changed from since on (None - all data)
+        if self.parent:
+            self.parent.refresh__energy_df(self, since)
+        for dependent in self.dependents:
+            dependent.refresh__energy_df(self, since)
     
     def debug_import_msg(self):
         if not self.debug: return
-        output = {col[0].strip('_').replace('_', " "): self.get_energy[col[0]].sum() for col in self.ENERGY_COLUMNS if col[0].endswith("_") and self.get_energy[col[0]].sum()>0}
+        totals = self.totals()
+        output = {col[0].strip('_').replace('_', " "): totals[col[0]] for col in self.ENERGY_COLUMNS if col[0].endswith("_") and totals[col[0]]>0}
         output_str = "\n".join([f'Total energy {key:15} - {value:,.2f} {self.unit}:' for key, value in output.items()])
         print(f'Source: {self.source_name}\n---------------------------------------\n' + output_str) 
 
     @property
     def get_energy(self):
+        return self.energy_frame()
+
+    def energy_frame(self, columns=None):
+        #
+        #   energy frame with calendar columns: all (None) or only selected, [] - none.
+        #   calendar columns are built on first use and kept until data changes
+        #
+        if self._lazy_load is not None:
+            load, self._lazy_load = self._lazy_load, None
+            self.add_df(load())
+        columns = self.CALENDAR_COLUMNS if columns is None else columns
+        missing = [col for col in self.CALENDAR_COLUMNS if col in columns and col not in self._energy_df.columns]
+        if missing and not self._energy_df.empty:
+            for col, values in self.calendar_columns(self._energy_df['date'], missing).items():
+                self._energy_df[col] = values
         return self._energy_df
 
+    def _touch(self, rows_dropped=False):
+        #
+        #   data changed. new rows have no calendar columns - built ones are dropped,
+        #   dropping rows only (rows_dropped) keeps them valid
+        #
+        self._version += 1
+        self._memo.clear()  # results of older versions are never served again
+        if not rows_dropped:
+            calendar = [col for col in self.CALENDAR_COLUMNS if col in self._energy_df.columns]
+            if calendar:
+                self._energy_df.drop(columns=calendar, inplace=True)
+
     def set_dates(self, d_min=None, d_max=None):
         #
         #   update date_min, date_max based on get_energy_
         #
+        if d_min or d_max:
+            self.energy_frame(['day'])
         if d_min:
             self.start_date = d_min
             to_drop = self._energy_df[self._energy_df['day'] < d_min].index.tolist()
             self._energy_df.drop(to_drop, inplace=True)
         else:
-            self.start_date = self.get_energy.date.min()
+            self.start_date = self._energy_df.date.min()
         if d_max:
-            self.stop_date = d_min
+            self.stop_date = d_max
             to_drop = self._energy_df[self._energy_df['day'] > d_max].index.tolist()
             self._energy_df.drop(to_drop, inplace=True)
         else:
-            self.stop_date = self.get_energy.date.max()
+            self.stop_date = self._energy_df.date.max()
+        if d_min or d_max:
+            self.apply_schema(self._energy_df)
+            self._touch(rows_dropped=True)
 
     def add_df(self, temp_df):
         if isinstance(temp_df, pd.DataFrame):
             self._energy_df = pd.DataFrame()
-            self.append_df(temp_df)
+            self.append_df(temp_df, replace=True)
         else:
             raise TypeError("it should be an DataFrame object") 
 
-    def append_df(self, temp_df):
+    def append_df(self, temp_df, replace=False):
         #
-        #   adding temp_df to _energy_df
+        #   adding temp_df to _energy_df, replace - _energy_df was emptied before (parent rebuilds all)
         #
         self.update_df(temp_df)
-        self._energy_df = self._energy_df.append(temp_df, ignore_index=True)
+        self._energy_df = pd.concat([self._energy_df, temp_df], ignore_index=True)
+        self._touch()
+        self.apply_schema(self._energy_df)
         self.set_dates()
-        if self.parent:
-            self.parent.refresh__energy_df()
+        self.notify_parent(None if replace or temp_df.empty else temp_df['date'].min())
+
+    def stage_df(self, temp_df):
+        #
+        #   buffer raw API chunk, derived columns are computed once per flush
+        #
+        if temp_df.empty:
+            return
+        self._staged.append(temp_df)
+        self._staged_rows += len(temp_df.index)
+        if self._staged_rows >= self.flush_size:
+            self.flush_staged()
+
+    def flush_staged(self):
+        #
+        #   join staged chunks into one block, compute derived columns for it and upsert it into _energy_df:
+        #   stored rows from the first new timestamp on are replaced (binary search on sorted date).
+        #   memory used by refresh - data and one block (flush_size rows)
+        #
+        if not self._staged:
+            return
+        new_df = pd.concat(self._staged, ignore_index=True)
+        self._staged, self._staged_rows = [], 0
+        self.update_df(new_df)
+        new_from = new_df['date'].min()
+        old_df = self.energy_frame([])
+        if not old_df.empty:
+            old_df = old_df.iloc[:old_df['date'].searchsorted(new_from)]
+        frames = [df for df in [old_df, new_df] if not df.empty]
+        self._energy_df = pd.concat(frames, ignore_index=True)
+        self._touch()
+        self.apply_schema(self._energy_df)
+        self._dirty_from = new_from if self._dirty_from is None else min(self._dirty_from, new_from)
+        self._flushed_from = new_from if self._flushed_from is None else min(self._flushed_from, new_from)
+
+    def commit_staged(self):
+        #
+        #   flush the rest of staged chunks, parent is notified once about all flushed blocks
+        #
+        self.flush_staged()
+        if self._flushed_from is None:
+            return
+        new_from, self._flushed_from = self._flushed_from, None
+        self.set_dates()
+        self.notify_parent(new_from)
 
     def update_df(self, temp_df):
         #
@@ -598,7 +1249,40 @@ class Energy(ABC):
         #
         self.add_name_and_direction(temp_df, self.source_name, self.direction)
         self.check_energy_columns(temp_df, self.ENERGY_COLUMNS)
-        self.extend_datetime_columns(temp_df)
+        self.calc_derived_columns(temp_df)
+        self.apply_schema(temp_df)
+
+    def apply_schema(self, temp_df):
+        #
+        #   compact column types (SCHEMA). concat of frames with different categories gives object column - converted back,
+        #   unused categories (left after rows are dropped) are removed - groupby shows only existing periods
+        #
+        for col, dtype in self.SCHEMA.items():
+            if col not in temp_df.columns:
+                continue
+            if dtype == 'category' and temp_df[col].dtype == 'category':
+                temp_df[col] = temp_df[col].cat.remove_unused_categories()
+            elif temp_df[col].dtype != dtype:
+                temp_df[col] = temp_df[col].astype(dtype)
+        energy_dtype = np.float32 if self.float32 else np.float64
+        for col in temp_df.columns:
+            if col.endswith('_') and temp_df[col].dtype != energy_dtype:
+                temp_df[col] = temp_df[col].astype(energy_dtype)
+
+    def memory_report(self):
+        #
+        #   memory used by energy frame columns (deep - object strings included)
+        #
+        usage = self.get_energy.memory_usage(index=False, deep=True)
+        report = pd.DataFrame({
+            'dtype': self.get_energy.dtypes.astype(str),
+            'MB': usage / 2 ** 20,
+            '%': usage / usage.sum() * 100,
+        })
+        report.loc['total'] = ['', usage.sum() / 2 ** 20, 100.0]
+        return report
+
+    def calc_derived_columns(self, temp_df):
         temp_df['balance_'] = - (temp_df['import_'] - temp_df['export_'] * self.export_back)
         temp_df['self_consumption_'] = temp_df['production_'] - temp_df['export_']
         temp_df['total_consumption_'] = temp_df['self_consumption_'] + temp_df['import_']
@@ -613,24 +1297,47 @@ class Energy(ABC):
         if not "direction" in temp_df.columns:
             temp_df["direction"] = direction
 
+    @classmethod
+    def extend_datetime_columns(cls, temp_df):
+        #
+        #   adding standard analyzing columns: day, time, year, month, week, hour
+        #
+        for col, values in cls.calendar_columns(temp_df['date']).items():
+            temp_df[col] = values
+
+    @classmethod
+    def calendar_columns(cls, dates, columns=None):
+        #
+        #   calendar columns from integer date components, labels are formatted once per unique value:
+        #   year '2021', month '2021/08', week '2021/33' (%W of week monday - week 00 belongs to previous year)
+        #
+        columns = columns or cls.CALENDAR_COLUMNS
+        output = {}
+        if 'day' in columns:
+            output['day'] = dates.dt.normalize()
+        if 'time' in columns:
+            output['time'] = (dates.dt.hour.astype(np.int32) * 3600 + dates.dt.minute.astype(np.int32) * 60).astype(cls.SCHEMA['time'])
+        if 'hour' in columns:
+            output['hour'] = dates.dt.hour.astype(cls.SCHEMA['hour'])
+        if 'year' in columns:
+            output['year'] = cls.labels(dates.dt.year.to_numpy(), lambda key: '{:04d}'.format(key), dates.index)
+        if 'month' in columns:
+            output['month'] = cls.labels(
+                dates.dt.year.to_numpy() * 100 + dates.dt.month.to_numpy(),
+                lambda key: '{:04d}/{:02d}'.format(key // 100, key % 100), dates.index)
+        if 'week' in columns:
+            monday = dates.dt.normalize() - pd.to_timedelta(dates.dt.weekday, unit='D')
+            week = (monday.dt.dayofyear.to_numpy() - 1 + 7) // 7
+            output['week'] = cls.labels(
+                monday.dt.year.to_numpy() * 100 + week,
+                lambda key: '{:04d}/{:02d}'.format(key // 100, key % 100), dates.index)
+        return output
+
     @staticmethod
-    def extend_datetime_columns(temp_df):
-        #
-        #   adding standard analyzing columns: date, time, year, month, week, hour
-        #
-        temp_df["day"] = pd.to_datetime(temp_df['date']).dt.date  # .astype(str)
-        temp_df['time'] = (
-            pd.to_datetime(temp_df['date']).dt.hour * 60 + 
-            pd.to_datetime(temp_df['date']).dt.minute
-        ) *60
-        temp_df['year'] = temp_df['date'].dt.strftime("%Y").astype(str)
-        temp_df['month'] = temp_df['date'].dt.strftime("%Y/%m").astype(str)
-        temp_df['week'] = temp_df['date'].dt.strftime("%Y/%W").astype(str)
-        temp_df['hour'] = temp_df.date.dt.hour
-        if any(temp_df['week'].str[-2:]=='00'):
-            max_day = temp_df.loc[temp_df['week'].str.endswith('00')]['date'].max()
-            max_week = (max_day - pd.Timedelta(days=(max_day.weekday()))).strftime("%Y/%W")
-            temp_df.loc[temp_df['week'].str.endswith('00'), 'week'] = max_week
+    def labels(keys, label, index):
+        # sorted integer keys -> categorical labels (chronological categories)
+        unique, codes = np.unique(keys, return_inverse=True)
+        return pd.Series(pd.Categorical.from_codes(codes, [label(key) for key in unique]), index=index)
 
     @staticmethod
     def check_energy_columns(temp_df, columns):
@@ -678,42 +1385,248 @@ class PanelEnergy(Energy):
 
 
 class CommonEnergy(Energy):
-    def __init__(self, sub_energy, **kwargs):
+    '''
+    collection of energy sources.
+    align=False - rows of sources stacked one after another
+    align=True - one row per timestamp, sources side by side (production_SolarEdge, import_Tauron, ...),
+        energy columns are sums of sources, derived columns are calculated on aligned rows
+    '''
+    def __init__(self, sub_energy, align=False, **kwargs):
         self.temp_subenergy = sub_energy
+        self.align = align
+        # set before read_data - aligned rows are labelled with it
+        kwargs.setdefault('source_name', 'Common EnergyCollection')
         super().__init__(**kwargs)
-        if self.source_name=="NoName":
-            self.source_name = 'Common EnergyCollection'
 
     def read_data(self):
         self.sub_energy = []
         if not type(self.temp_subenergy)==list:
             self.append_subenergy(self.temp_subenergy)
-            d_min, d_max = self.temp_subenergy.get_energy.day.min(), self.temp_subenergy.get_energy.day.max()
         else:
-            d_min, d_max = self.temp_subenergy[0].get_energy.day.min(), self.temp_subenergy[0].get_energy.day.max()
             for sub_energy_item in self.temp_subenergy:
                self.append_subenergy(sub_energy_item) 
-               if sub_energy_item.get_energy.day.min() > d_min:
-                   d_min = sub_energy_item.get_energy.day.min()
-               if sub_energy_item.get_energy.day.max() < d_max:
-                   d_max = sub_energy_item.get_energy.day.max()    
-        self.set_dates(d_min, d_max)
+        self.set_dates(*self.overlap())
         self.temp_subenergy = None
 
-    def refresh__energy_df(self):
-        pass
-        self._energy_df = pd.DataFrame()
-        for sub_energy in self.sub_energy:
-            self.append_df(sub_energy.get_energy)
+    def overlap(self):
+        # first and last day covered by all sources
+        dates = [sub_energy.energy_frame([])['date'] for sub_energy in self.sub_energy]
+        return max(date.min() for date in dates).normalize(), min(date.max() for date in dates).normalize()
+
+    def keep_overlap(self):
+        #
+        #   rows of days not covered by all sources are dropped (as in read_data), start / stop dates follow sources
+        #
+        d_min, d_max = self.overlap()
+        dates = self._energy_df['date']
+        if dates.min() < d_min or dates.max() >= d_max + timedelta(days=1):
+            self.set_dates(d_min, d_max)
+        else:
+            self.start_date, self.stop_date = d_min, d_max
+
+    def refresh__energy_df(self, sub_energy=None, since=None):
+        #
+        #   sub_energy data changed from since on - only that range is merged again,
+        #   derived columns are calculated for merged rows only. since None - full rebuild.
+        #   merged data is limited to days covered by all sources: days dropped before are merged again
+        #   from all sources when overlap grows (full rebuild when it starts earlier)
+        #
+        sources = [sub_energy]
+        if not (sub_energy is None or since is None or self._energy_df.empty):
+            d_min, d_max = self.overlap()
+            if d_min < pd.Timestamp(self.start_date).normalize():
+                since = None
+            elif d_max > pd.Timestamp(self.stop_date).normalize():
+                since, sources = min(since, pd.Timestamp(self.stop_date).normalize() + timedelta(days=1)), self.sub_energy
+        if sub_energy is None or since is None or self._energy_df.empty:
+            if self.align:
+                self.add_df(self.aligned_frame())
+            else:
+                self._energy_df = pd.DataFrame()
+                for sub_energy in self.sub_energy:
+                    # copy - derived columns are calculated again (export_back of collection)
+                    self.append_df(sub_energy.energy_frame([]).copy())
+            self.keep_overlap()
+            return
+        if self.align:
+            temp_df = self.aligned_frame(since)
+            self._energy_df = self._energy_df.iloc[:self._energy_df['date'].searchsorted(since)]
+            new_columns = [col for col in temp_df.columns if col not in self._energy_df.columns]
+            self.append_df(temp_df)
+            if new_columns:
+                # source started to report new column, older rows have 0
+                self._energy_df[new_columns] = self._energy_df[new_columns].fillna(0)
+                self._touch(rows_dropped=True)
+        else:
+            temp_df = pd.concat([
+                sub_df[sub_df['date'] >= since] for sub_df in [source.energy_frame([]) for source in sources]
+            ], ignore_index=True)
+            self._energy_df = self._energy_df[
+                ~self._energy_df['source'].isin([source.source_name for source in sources]) | (self._energy_df['date'] < since)
+            ]
+            self.append_df(temp_df)
+        self.keep_overlap()
 
     def append_subenergy(self, sub_energy):
         if not isinstance(sub_energy, Energy):
             raise TypeError("it should be an Energy object")
             return
-        self.append_df(sub_energy.get_energy)
+        sub_energy.parent = self
+        if self.align:
+            self.sub_energy.append(sub_energy)
+            self.add_df(self.aligned_frame())
+            return
+        self.append_df(sub_energy.energy_frame([]).copy())
         self.sub_energy.append(sub_energy)
+
+    def aligned_frame(self, since=None):
+        #
+        #   sources merged on date (outer join, missing values 0), energy columns summed over sources.
+        #   columns source never reports (all 0, e.g. import_SolarEdge) are skipped,
+        #   since - only rows from since on (columns already in _energy_df are kept)
+        #
+        energy_columns = [col[0] for col in self.ENERGY_COLUMNS if col[0].endswith('_')]
+        frames = []
+        for sub_energy in self.sub_energy:
+            sub_df = sub_energy.energy_frame([])
+            if since is not None:
+                sub_df = sub_df[sub_df['date'] >= since]
+            sub_df = sub_df.set_index('date')[energy_columns]
+            if not sub_df.index.is_unique:
+                sub_df = sub_df.groupby(level=0).sum()
+            sub_df = sub_df.add_suffix(sub_energy.source_name)
+            frames.append(sub_df.loc[:, (sub_df != 0).any() | sub_df.columns.isin(self._energy_df.columns)])
+        temp_df = pd.concat(frames, axis=1, join='outer').fillna(0).sort_index()
+        for col in energy_columns:
+            source_columns = [col + sub_energy.source_name for sub_energy in self.sub_energy]
+            temp_df[col] = temp_df[[src for src in source_columns if src in temp_df.columns]].sum(axis=1)
+        temp_df.index.name = 'date'
+        return temp_df.reset_index()
         
     def __str__(self) -> str:
         return self.sub_energy[0].str_head() + '\n'.join([sub.__str__() for sub in self.sub_energy] +[super().__str__()])
 
 
+class BatteryEnergy(Energy):
+    '''
+    synthetic source - effect of home battery on grid energy of energy object (e.g. Tauron).
+    import_ / export_ are changes made by battery (negative - less energy from / to grid),
+    so CommonEnergy([solar, tauron, BatteryEnergy(tauron, 10)], align=True) shows data with battery.
+    soc - state of charge by date [kWh]
+    battery is simulated again when energy data changes (energy.dependents)
+    '''
+    def __init__(self, 
+            energy,  # source of import_ / export_
+            capacity,  # kWh
+            charge_power = None,  # kW, default 0.5 C
+            discharge_power = None,  # kW, default charge_power
+            efficiency = 0.9,  # round trip
+            **kwargs
+        ):
+        self.energy = energy
+        self.capacity = capacity
+        self.charge_power = charge_power
+        self.discharge_power = discharge_power
+        self.efficiency = efficiency
+        kwargs.setdefault('source_name', 'Battery')
+        kwargs.setdefault('refresh', False)
+        super().__init__(**kwargs)
+        energy.dependents.append(self)
+
+    def read_data(self):
+        # nothing is read or stored - simulated from energy
+        temp_df, hours = grid_flows(self.energy.energy_frame([]))
+        result = simulate_battery(
+            temp_df['import_'], temp_df['export_'], self.capacity, 
+            self.charge_power, self.discharge_power, self.efficiency, hours
+        )
+        self.soc = pd.Series(result['soc_'][:, 0], index=temp_df['date'].to_numpy(), name='soc')
+        self.add_df(pd.DataFrame({
+            'date': temp_df['date'].to_numpy(),
+            'production_': 0.0,
+            'import_': result['import_'][:, 0] - temp_df['import_'].to_numpy(),
+            'export_': result['export_'][:, 0] - temp_df['export_'].to_numpy(),
+        }))
+
+    def refresh__energy_df(self, sub_energy=None, since=None):
+        # state of charge depends on whole history - simulated again, parent rebuilds all battery rows
+        self.read_data()
+
+    def save_to_file(self):
+        pass
+
+
+class EnergyView(Energy):
+    '''
+    read-only range start <= date < stop of energy object, nothing is loaded or copied:
+    rows are positional slice of sorted date (binary search), calendar columns are built once in viewed object.
+    view has own memo and rollup cube, they are valid while viewed object data version does not change.
+    reports of several periods from one load:
+        for start, stop in periods:
+            energy.view(start, stop).group_report_pages(pdf=pdf, group_by='day(s)')
+    view of CommonEnergy keeps views of its sources (sub_energy) with the same range
+    '''
+    SHARED_SKIP = ['_energy_df', '_version', '_memo', '_cube', '_lazy_load', 'start_date', 'stop_date', 'parent']
+    _lazy_load = None
+
+    def __init__(self, energy, start=None, stop=None):
+        self.__dict__.update({key: value for key, value in energy.__dict__.items() if key not in self.SHARED_SKIP})
+        self.energy = energy
+        self.start = start
+        self.stop = stop
+        self.parent = None
+        if getattr(energy, 'sub_energy', None):
+            self.sub_energy = [sub_energy.view(start, stop) for sub_energy in energy.sub_energy]
+        self._memo = OrderedDict()
+        self._cube = None
+        self._rows = None  # (version, rows)
+
+    @property
+    def _version(self):
+        return self.energy._version
+
+    def rows(self, start=None, stop=None):
+        if start is None and stop is None:
+            # own range, found once per data version
+            self.energy.energy_frame([])
+            if self._rows is None or self._rows[0] != self._version:
+                self._rows = (self._version, self.energy.rows(self.start, self.stop))
+            return self._rows[1]
+        return super().rows(start, stop)
+
+    @property
+    def _energy_df(self):
+        return self.energy_frame([])
+
+    @_energy_df.setter
+    def _energy_df(self, value):
+        self._touch()
+
+    def energy_frame(self, columns=None):
+        rows = self.rows()
+        return self.energy.energy_frame(columns).iloc[rows]
+
+    @property
+    def start_date(self):
+        temp_df = self.energy_frame([])
+        return temp_df['date'].min() if not temp_df.empty else None
+
+    @property
+    def stop_date(self):
+        temp_df = self.energy_frame([])
+        return temp_df['date'].max() if not temp_df.empty else None
+
+    def stored_aggregate(self, group_by, agg='sum'):
+        # stored data cover whole viewed object
+        return None
+
+    def __str__(self) -> str:
+        if not getattr(self, 'sub_energy', None):
+            return super().__str__()
+        return self.sub_energy[0].str_head() + '\n'.join([sub.__str__() for sub in self.sub_energy] + [super().__str__()])
+
+    def _touch(self, rows_dropped=False):
+        raise TypeError("EnergyView is read-only, change viewed object ({})".format(self.source_name))
+
+    def save_to_file(self):
+        raise TypeError("EnergyView is read-only, save viewed object ({})".format(self.source_name))
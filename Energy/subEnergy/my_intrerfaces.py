@@ -1,22 +1,50 @@
+import os
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
 
 import pandas as pd
+import requests
 from solaredge import solaredge as se
 
-from Energy import get_debug
-from Energy.subTools.Tauron_API import TauronAPI
+from Energy import STORAGE_DIR, get_debug
+from Energy.subTools.Tauron_API import TauronAPI, readings_to_df
+from Energy.subTools.response_cache import CacheMiss
+from Energy.subTools.tools import CallCounter, TokenBucket, retry
 
 SOLAREDGE_TIME_UNITS = ['QUARTER_OF_AN_HOUR', 'HOUR', 'DAY', 'WEEK', 'MONTH', 'YEAR']
+SOLAREDGE_DAILY_QUOTA = 300  # API requests per site per day
+SOLAREDGE_MAX_WORKERS = 3  # API accepts max 3 concurrent calls from one IP
+SOLAREDGE_MAX_WINDOW = {  # longest energy request per time unit (months), other units - no limit
+    'QUARTER_OF_AN_HOUR': 1,
+    'HOUR': 1,
+    'DAY': 12,
+}
+WINDOW_EPOCH = date(2000, 1, 3)  # monday - day_batch windows are counted from it (day_batch 7 - calendar weeks)
+
+def as_date(value):
+    # accept iso string, datetime, Timestamp or date
+    if value is None or type(value) == date:
+        return value
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value.date()
 
 class Energy_Interface(ABC):
     name = 'master'
-    def __init__(self, login_data, start_date=None, day_batch = 5, UNITS = None):
+    DEFAULT_DAY_BATCH = 5
+    RETRY_ATTEMPTS = 5
+    RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.HTTPError)  # HTTP errors - only 5xx are retried
+    def __init__(self, login_data, start_date=None, day_batch = None, UNITS = None, workers = 1, cache = None, first_date = None):
         super().__init__()
         self.login_data = login_data
-        self.start_date = start_date
+        self.start_date = as_date(start_date)
+        self.first_date = as_date(first_date)  # nothing is requested before it (start of history)
         self.day_batch = day_batch
         self.units = UNITS
+        self.workers = workers
+        self.cache = cache  # ResponseCache or None
         
     @abstractmethod
     def _init_connection(self):
@@ -36,90 +64,212 @@ class Energy_Interface(ABC):
     
     def __exit__(self, type, value, traceback):
         self._close_connection()
+
+    @staticmethod
+    def retryable(error):
+        # 4xx (wrong key, no access, quota exceeded) is not fixed by retry - every retry takes request from budget
+        response = getattr(error, 'response', None)
+        return response is None or response.status_code >= 500
+
+    def _retrying(self, fetch):
+        def fetch_with_retry(*window):
+            return retry(
+                lambda: fetch(*window), attempts=self.RETRY_ATTEMPTS, exceptions=self.RETRY_EXCEPTIONS, retryable=self.retryable
+            )
+        return fetch_with_retry
+
+    def cached(self, fetch, endpoint, source_id, start_date=None, end_date=None, **params):
+        # fetch() result through response cache (when cache is set)
+        if not self.cache:
+            return fetch()
+        return self.cache.fetch(fetch, '{}/{}'.format(self.name, endpoint), source_id, start_date, end_date, **params)
+
+    def window_start(self, day):
+        # first day of fixed window containing day
+        day_batch = self.day_batch or self.DEFAULT_DAY_BATCH
+        return day - timedelta(days=(day - WINDOW_EPOCH).days % day_batch)
+
+    def window_end(self, window_start):
+        # last day of fixed window containing window_start
+        return self.window_start(window_start) + timedelta(days=(self.day_batch or self.DEFAULT_DAY_BATCH) - 1)
+
+    def windows(self):
+        #
+        #   request windows [start, end] covering start_date - end_date. windows are fixed (calendar),
+        #   not counted from start_date: every run asks for the same windows - cached responses are found
+        #   after sync start moves or data is rebuilt. first window starts at start of fixed window
+        #   (days before start_date are fetched again), but not before first_date
+        #
+        imp_start_date = self.window_start(self.start_date)
+        if self.first_date is not None:
+            imp_start_date = max(imp_start_date, self.first_date)
+        while imp_start_date <= self.end_date:
+            imp_end_date = min(self.end_date, self.window_end(imp_start_date))
+            yield imp_start_date, imp_end_date
+            imp_start_date = imp_end_date + timedelta(days=1)
+
+    @property
+    def planned_calls(self):
+        return sum(1 for _ in self.windows())
+
+    def fetch_windows(self, fetch):
+        #
+        #   offline (replay of cached responses) stops on first window not in cache,
+        #   windows replayed before it are kept
+        #
+        try:
+            yield from self._fetch_windows(fetch)
+        except CacheMiss as E:
+            if not (self.cache and self.cache.offline):
+                raise
+            print("!!!!!!\n{} - {}, replay stopped".format(self.name, E))
+
+    def _fetch_windows(self, fetch):
+        #
+        #   yield fetch(start, end) for every window in date order, failed request is retried with backoff.
+        #   with workers > 1 requests run in thread pool, max 2 * workers requests in flight
+        #
+        fetch = self._retrying(fetch)
+        if self.workers <= 1:
+            for window in self.windows():
+                yield fetch(*window)
+            return
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                for window in self.windows():
+                    pending.append(executor.submit(fetch, *window))
+                    if len(pending) >= 2 * self.workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
         
 
 class SolarEdge_Interface(Energy_Interface):
     name = 'SolarEdge'
     def _init_connection(self):
+        #
+        #   solaredge library takes API url from module global - URL (e.g. local mock endpoint) is set
+        #   for this connection only, previous url is restored on close (also when connection fails)
+        #
+        self.base_url = se.BASEURL
+        if self.login_data.get('URL'):
+            se.BASEURL = self.login_data['URL']
+        try:
+            self._connect()
+        except BaseException:
+            self._close_connection()
+            raise
+
+    def _connect(self):
         try:
             self.connection = se.Solaredge(self.login_data['KEY'])
             self.time_unit = self.login_data.get('TIME_UNIT', '') if self.login_data.get('TIME_UNIT', '') in SOLAREDGE_TIME_UNITS else 'HOUR'
             self.ID = self.login_data['ID']
             self.debug = get_debug()
+            # calls of earlier runs today are taken from budget (file next to response cache)
+            self.calls = CallCounter(
+                os.path.join(self.cache.directory if self.cache else STORAGE_DIR, 'SolarEdge.calls.json'), self.ID
+            )
+            self.budget = TokenBucket(self.login_data.get('DAILY_QUOTA', SOLAREDGE_DAILY_QUOTA), used=self.calls.used)
+            self.workers = min(self.workers, SOLAREDGE_MAX_WORKERS)
         except Exception as E:
             print(E)
         try:
-            dates = self.connection.get_data_period(self.ID)
-            if self.debug:
-                print(dates)
-        except Exception as E:
-            print(E)
-        if not self.start_date: self.start_date = date.fromisoformat(dates["dataPeriod"]["startDate"]) 
+            dates = self.cached(lambda: self._call(self.connection.get_data_period, self.ID), 'dataPeriod', self.ID)
+        except CacheMiss as E:
+            raise CacheMiss('{} - data period of site {} not cached, run once online before offline rebuild'.format(
+                self.name, self.ID)) from E
+        if self.debug:
+            print(dates)
+        data_start = date.fromisoformat(dates["dataPeriod"]["startDate"])
+        if not self.start_date: self.start_date = data_start
+        self.first_date = max(self.first_date, data_start) if self.first_date else data_start
         self.end_date = date.fromisoformat(dates["dataPeriod"]["endDate"])
         self.days =  (self.end_date - self.start_date).days + 1 
     
+    def window_start(self, day):
+        # calendar months (DAY unit - years), one window for units without limit
+        if self.day_batch:
+            return super().window_start(day)
+        if self.time_unit not in SOLAREDGE_MAX_WINDOW:
+            return day
+        months = SOLAREDGE_MAX_WINDOW[self.time_unit]
+        month = day.year * 12 + day.month - 1
+        month -= month % months
+        return date(month // 12, month % 12 + 1, 1)
+
+    def window_end(self, window_start):
+        if self.day_batch:
+            return super().window_end(window_start)
+        if self.time_unit not in SOLAREDGE_MAX_WINDOW:
+            return self.end_date
+        months = SOLAREDGE_MAX_WINDOW[self.time_unit]
+        return (pd.Timestamp(self.window_start(window_start)) + pd.DateOffset(months=months)).date() - timedelta(days=1)
+
     def get_dataset(self):
-        for i in range(0, self.days, self.day_batch):
-            imp_start_date = self.start_date + timedelta(days=i)
-            imp_end_date = min(self.end_date, imp_start_date + timedelta(days=self.day_batch - 1))
-            day_energy = self.connection.get_energy(
+        if self.planned_calls > self.budget.available:
+            print('!!!!!!\n{} - {} API calls planned, daily quota left: {}'.format(self.name, self.planned_calls, self.budget.available))
+        yield from self.fetch_windows(self._get_window)
+
+    def _call(self, method, *args, **kwargs):
+        # every real API call is taken from daily budget and counted
+        self.budget.acquire()
+        self.calls.add()
+        return method(*args, **kwargs)
+
+    def _get_window(self, imp_start_date, imp_end_date):
+        day_energy = self.cached(
+                lambda: self._call(
+                    self.connection.get_energy,
                     self.ID, 
                     imp_start_date.isoformat(), 
                     imp_end_date.isoformat(), 
                     time_unit=self.time_unit 
-                )
-            temp_df = pd.DataFrame.from_records(day_energy["energy"]["values"])
-            temp_df = temp_df.fillna(0)
-            temp_df.rename(columns={'value': 'production_'}, inplace = True)
-            temp_df['production_'] = temp_df['production_'] * self.units['kWh'] / self.units[day_energy['energy']['unit']]
-            temp_df.date = pd.to_datetime(temp_df['date'], format="%Y-%m-%d %H:%M:%S")
-            yield temp_df
+                ),
+                'energy', self.ID, imp_start_date, imp_end_date, time_unit=self.time_unit
+            )
+        temp_df = pd.DataFrame.from_records(day_energy["energy"]["values"])
+        temp_df = temp_df.fillna(0)
+        temp_df.rename(columns={'value': 'production_'}, inplace = True)
+        temp_df['production_'] = temp_df['production_'] * self.units['kWh'] / self.units[day_energy['energy']['unit']]
+        temp_df.date = pd.to_datetime(temp_df['date'], format="%Y-%m-%d %H:%M:%S")
+        return temp_df
             
     def _close_connection(self):
         self.connection = None
+        se.BASEURL = self.base_url
 
 
 class Tauron_Interface(Energy_Interface):
     name = 'Tauron'
     def _init_connection(self):
-        self.connection = TauronAPI(self.login_data['USER_NAME'], self.login_data['PASSWORD'], self.login_data['ID'])
-        self.connection.login()
+        self.connection = TauronAPI(
+            self.login_data['USER_NAME'], self.login_data['PASSWORD'], self.login_data['ID'],
+            cookie_file=self.login_data.get('COOKIE_FILE', STORAGE_DIR + 'Tauron.cookies'),
+            pool_size=max(self.workers, 1),
+            cache=self.cache,
+        )
+        # login is done by TauronAPI on first request not found in cache
         
         self.end_date = date.today()
         self.days =  (self.end_date - self.start_date).days + 1 
         
     def _close_connection(self):
+        self.connection.close()
         self.connection = None
     
     def get_dataset(self):
-        for i in range(0, self.days, self.day_batch):
-            imp_start_date = self.start_date + timedelta(days=i)
-            imp_end_date = min(self.end_date, imp_start_date + timedelta(days=self.day_batch - 1))
-            day_energy = self.connection.get_readings(imp_start_date, imp_end_date)
-            consumed = dict(self._extract_values_with_timestamps(day_energy.get("chart", [])))
-            produced = dict(self._extract_values_with_timestamps(day_energy.get("OZE", [])))
-            temp_df = pd.DataFrame( 
-                    sorted(
-                    (timestamp, float(consumed.get(timestamp)), float(produced.get(timestamp)))
-                    for timestamp in set(consumed) | set(produced)
-                ), columns=['date', 'import_', 'export_']
-            )
-            temp_df = temp_df.fillna(0)    
-            temp_df.date = temp_df.date - timedelta(hours=1)
-            yield temp_df
-            
-    @staticmethod
-    def _extract_values_with_timestamps(data):
-        for element in data:
-            date = element.get("Date")
-            hour = int(element.get("Hour"))
-            value = float(element.get("EC"))
-            # TODO: There's also an "Extra" field, which seems to be set to be set to "T" only for the one extra hour
-            # when switching from CEST to CET (e.g. 3 AM on 2021-10-31)
-            timestamp = datetime.strptime(date, "%Y-%m-%d")
-            timestamp += timedelta(hours=hour)
-            value = element.get("EC")
-            yield timestamp, value
+        yield from self.fetch_windows(self._get_window)
+
+    def _get_window(self, imp_start_date, imp_end_date):
+        day_energy = self.connection.get_readings(imp_start_date, imp_end_date)
+        temp_df = readings_to_df(day_energy)
+        temp_df.date = temp_df.date - timedelta(hours=1)
+        return temp_df
             
 class SolarEdge_Panel_Interface(Energy_Interface):
     name = 'SolarEdge_Panel'            
@@ -0,0 +1,61 @@
+import pandas as pd
+
+
+class RollupCube:
+    '''
+    pre-aggregated energy columns shared by report pages.
+    one pass over raw data builds hour buckets (sum, min, max, count),
+    levels hour (of day), day, week, month, year and month x hour are rolled up from buckets.
+    mean = sum / count, so every aggregate equals groupby over raw rows.
+    '''
+    LEVELS = [('hour',), ('day',), ('week',), ('month',), ('year',), ('month', 'hour')]
+    AGGS = ['sum', 'min', 'max', 'mean', 'count']
+    ROLLUP = {'sum': 'sum', 'min': 'min', 'max': 'max', 'count': 'sum'}
+
+    def __init__(self, energy_df, columns, calendar_columns):
+        #
+        #   energy_df - frame with date and energy columns,
+        #   calendar_columns - function(dates, columns) building calendar columns of bucket dates
+        #
+        self.columns = list(columns)
+        buckets = energy_df.groupby(energy_df['date'].dt.floor('H'))[self.columns].agg(['sum', 'min', 'max', 'count'])
+        keys = sorted(set(key for level in self.LEVELS for key in level))
+        dates = pd.Series(buckets.index, index=buckets.index)
+        for key, values in calendar_columns(dates, keys).items():
+            buckets[key] = values
+        self.levels = {level: self._rollup(buckets, level) for level in self.LEVELS}
+
+    def _rollup(self, buckets, level):
+        temp_df = buckets.groupby(list(level), observed=True).agg(
+            {(col, agg): rollup for col in self.columns for agg, rollup in self.ROLLUP.items()}
+        )
+        for col in self.columns:
+            temp_df[(col, 'mean')] = temp_df[(col, 'sum')] / temp_df[(col, 'count')]
+        return temp_df
+
+    @staticmethod
+    def level(group_by):
+        return (group_by,) if isinstance(group_by, str) else tuple(group_by)
+
+    def has(self, group_by, agg='sum', columns=None):
+        return (
+            self.level(group_by) in self.levels and isinstance(agg, str) and agg in self.AGGS
+            and all(col in self.columns for col in (columns or []))
+        )
+
+    def get(self, group_by, agg='sum', columns=None):
+        #
+        #   aggregated columns by group_by (group columns first, as groupby(...).agg(agg).reset_index())
+        #
+        columns = list(columns or self.columns)
+        temp_df = self.levels[self.level(group_by)][[(col, agg) for col in columns]]
+        temp_df.columns = columns
+        return temp_df.reset_index()
+
+    def total(self, agg='sum', columns=None):
+        # aggregate over all data (from year level)
+        columns = list(columns or self.columns)
+        temp_df = self.levels[('year',)]
+        if agg == 'mean':
+            return pd.Series({col: temp_df[(col, 'sum')].sum() / temp_df[(col, 'count')].sum() for col in columns})
+        return pd.Series({col: temp_df[(col, agg)].agg(self.ROLLUP[agg]) for col in columns})
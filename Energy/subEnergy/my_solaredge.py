@@ -5,6 +5,8 @@ import pandas as pd
 from solaredge import solaredge as se
 
 from .my_energy import  Energy
+from .my_intrerfaces import Energy_Interface
+from Energy.subTools.tools import retry
 
 class MySolarEdge(Energy):
 
@@ -15,6 +17,7 @@ class MySolarEdge(Energy):
         **kwargs
     ):
 
+        kwargs.setdefault('day_batch', 5)
         super().__init__(source_name = "SolarEdge", **kwargs)
         self.se_key = se_key
         self.se_id = se_id
@@ -47,21 +50,30 @@ class MySolarEdge(Energy):
             if not self.refresh: return
         except FileNotFoundError as E:
             print("!!!!!!\n{} - no historical data".format(self.source_name))
+        frames = []
         try:
             days = (end_date - start_date).days + 1
             for i in range(0, days, self.day_batch):
                 imp_start_date = start_date + timedelta(days=i)
                 imp_end_date = min(end_date, imp_start_date + timedelta(days=self.day_batch - 1))
-                day_energy = s.get_energy(
-                    self.se_id, 
-                    imp_start_date.isoformat(), 
-                    imp_end_date.isoformat(), 
-                    time_unit=self.time_unit 
+                day_energy = retry(
+                    lambda: s.get_energy(
+                        self.se_id, 
+                        imp_start_date.isoformat(), 
+                        imp_end_date.isoformat(), 
+                        time_unit=self.time_unit 
+                    ), 
+                    exceptions=Energy_Interface.RETRY_EXCEPTIONS, 
+                    retryable=Energy_Interface.retryable
                 )
-                temp_df =  temp_df.append( 
-                    pd.DataFrame.from_records(day_energy["energy"]["values"]), ignore_index=True
-                    ) if i else pd.DataFrame.from_records(day_energy["energy"]["values"])
-
+                frames.append(pd.DataFrame.from_records(day_energy["energy"]["values"]))
+        except Exception as E:
+            print("!!!!!\n", E)  
+        # keep windows fetched before error
+        if not frames:
+            return
+        try:
+            temp_df = pd.concat(frames, ignore_index=True)
             temp_df = temp_df.fillna(0)
             temp_df.rename(columns={'value': 'production_'}, inplace = True)
             temp_df['production_'] = temp_df['production_'] * self.UNITS['kWh'] / self.UNITS[day_energy['energy']['unit']]
@@ -0,0 +1,162 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ..subTools.tools import jit
+
+HOLIDAY = 7  # row of holiday zones in schedule (after weekdays 0 - Monday ... 6 - Sunday)
+
+
+def easter(year):
+    # Gregorian Easter Sunday (anonymous algorithm)
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month, day = divmod(h + l - 7 * m + 90, 25)
+    return date(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+
+def holidays_pl(years):
+    '''
+    public holidays in Poland in years (free days, zone of weekend / holiday)
+    '''
+    holidays = []
+    for year in years:
+        holidays += [date(year, month, day) for month, day in [
+            (1, 1), (1, 6), (5, 1), (5, 3), (8, 15), (11, 1), (11, 11), (12, 25), (12, 26)
+        ]]
+        sunday = easter(year)
+        holidays += [sunday, sunday + timedelta(days=1), sunday + timedelta(days=49), sunday + timedelta(days=60)]
+    return sorted(holidays)
+
+
+class Tariff:
+    '''
+    time of use tariff.
+    prices - price of 1 kWh in zone {zone: price},
+    schedule - zone of every hour: 8 x 24 table, rows 0-6 weekdays (Monday first), row 7 holidays.
+    zone of timestamps is looked up in one numpy take (weekday / holiday row * 24 + hour)
+    usage:
+        Tariff.day_night(0.78, 0.42)
+        Tariff.weekend(0.80, 0.45)
+    '''
+    def __init__(self, prices, schedule=None, holidays=holidays_pl, name=''):
+        #
+        #   holidays - list of dates or function(years) -> list of dates
+        #
+        self.name = name
+        self.zones = list(prices)
+        self.prices = np.array([prices[zone] for zone in self.zones], dtype=np.float64)
+        if schedule is None:
+            schedule = [[self.zones[0]] * 24] * 8
+        codes = np.array([[self.zones.index(zone) for zone in row] for row in schedule], dtype=np.int8)
+        if codes.shape != (8, 24):
+            raise ValueError('tariff schedule should have 8 rows (weekdays + holiday) of 24 hours')
+        self.schedule = codes.ravel()
+        self.holidays = holidays
+
+    @classmethod
+    def single(cls, price):
+        # G11 - one price all the time
+        return cls({'all day': price}, name='G11')
+
+    @classmethod
+    def day_night(cls, day_price, night_price, night_hours=(13, 14, 22, 23, 0, 1, 2, 3, 4, 5)):
+        # G12 - cheap zone 13-15 and 22-6 every day
+        row = ['night' if hour in night_hours else 'day' for hour in range(24)]
+        return cls({'day': day_price, 'night': night_price}, [row] * 8, name='G12')
+
+    @classmethod
+    def weekend(cls, day_price, night_price, night_hours=(13, 14, 22, 23, 0, 1, 2, 3, 4, 5)):
+        # G12w - as G12, whole weekend and holidays in cheap zone
+        row = ['night' if hour in night_hours else 'day' for hour in range(24)]
+        return cls({'day': day_price, 'night': night_price}, [row] * 5 + [['night'] * 24] * 3, name='G12w')
+
+    def zone_codes(self, dates):
+        #
+        #   zone code of every timestamp (index of self.zones)
+        #
+        dates = pd.DatetimeIndex(dates)
+        row = np.asarray(dates.weekday, dtype=np.int64)
+        holidays = self.holidays(range(dates.year.min(), dates.year.max() + 1)) if callable(self.holidays) else self.holidays
+        if len(holidays) and len(dates):
+            row[np.isin(dates.normalize().to_numpy(), pd.DatetimeIndex(holidays).to_numpy())] = HOLIDAY
+        return self.schedule[row * 24 + np.asarray(dates.hour, dtype=np.int64)]
+
+    @property
+    def key(self):
+        holidays = self.holidays.__name__ if callable(self.holidays) else tuple(self.holidays)
+        return (self.name, tuple(self.zones), tuple(self.prices), self.schedule.tobytes(), holidays)
+
+    def price(self, dates):
+        return self.prices[self.zone_codes(dates)]
+
+    def __str__(self):
+        return '{} ({})'.format(
+            self.name, ', '.join('{}: {:.2f}'.format(zone, price) for zone, price in zip(self.zones, self.prices))
+        )
+
+
+@jit
+def net_metering(banked, imports, times, expiry):
+    #
+    #   FIFO energy bank: banked[i] deposited in hour i is usable until expiry[i],
+    #   imports are covered by the oldest deposits first. O(n) - every deposit is opened and closed once
+    #
+    n = len(imports)
+    offset = np.zeros(n)
+    expired = np.zeros(n)
+    balance = np.zeros(n)
+    left = banked.copy()
+    head = 0
+    bank = 0.0
+    for i in range(n):
+        bank += banked[i]
+        while head <= i and expiry[head] <= times[i]:
+            expired[i] += left[head]
+            bank -= left[head]
+            left[head] = 0.0
+            head += 1
+        need = imports[i]
+        while need > 0.0 and head <= i:
+            take = min(need, left[head])
+            left[head] -= take
+            need -= take
+            offset[i] += take
+            bank -= take
+            if left[head] <= 0.0:
+                head += 1
+        balance[i] = bank
+    return offset, expired, balance
+
+
+def settle(dates, import_, export_, tariff, export_back=0.8, window_months=12):
+    '''
+    net-metering settlement of hourly series.
+    export_ * export_back is banked, import_ is covered by bank (max window_months old energy),
+    rest of import_ is paid with price of its zone.
+    returns frame by date: zone, price, banked_, offset_, paid_, expired_, bank_ (kWh), cost
+    '''
+    dates = pd.DatetimeIndex(dates)
+    imports = np.asarray(import_, dtype=np.float64)
+    banked = np.asarray(export_, dtype=np.float64) * export_back
+    expiry = (dates + pd.DateOffset(months=window_months)).asi8
+    offset, expired, balance = net_metering(banked, imports, dates.asi8, expiry)
+    codes = tariff.zone_codes(dates)
+    price = tariff.prices[codes]
+    paid = imports - offset
+    return pd.DataFrame({
+        'zone': pd.Categorical.from_codes(codes, tariff.zones),
+        'price': price,
+        'banked_': banked,
+        'offset_': offset,
+        'paid_': paid,
+        'expired_': expired,
+        'bank_': balance,
+        'cost': paid * price,
+    }, index=dates)
@@ -4,8 +4,10 @@ from datetime import date, datetime, timedelta
 import pandas as pd
 
 from .my_energy import  Energy
+from .my_intrerfaces import Energy_Interface
 from Energy import STORAGE_DIR, OUTPUT_DIR
-from Energy.subTools.Tauron_API import TauronAPI
+from Energy.subTools.Tauron_API import TauronAPI, readings_to_df
+from Energy.subTools.tools import retry
 
         
 class MyTauron(Energy):
@@ -13,6 +15,7 @@ class MyTauron(Energy):
         files,  # filelist with tauron data
         **kwargs
     ) -> None:
+        kwargs.setdefault('day_batch', 5)
         super().__init__(source_name = "Tauron", **kwargs)
         self.files = files
         if type(self)==MyTauron:
@@ -74,22 +77,28 @@ class MyAPITauron(MyTauron):
             print("!!!!!!\n{} - no historical data".format(self.source_name))
         s = TauronAPI(self.username, self.password, self.meter_id)
         s.login()
+        frames = []
         try:
             days = (end_date - start_date).days + 1
             for i in range(0, days, self.day_batch):
                 date_srt = start_date + timedelta(days=i)
                 end_date_srt = min(end_date, date_srt + timedelta(days=self.day_batch - 1))
-                day_energy = s.get_readings(date_srt, end_date_srt)
-                temp_df =  temp_df.append(day_energy, ignore_index=True
-                    ) if i else day_energy
-            temp_df = temp_df.fillna(0)    
-            temp_df.date = temp_df.date - timedelta(hours=1)
-            self.append_df(temp_df)
-            self.save_to_file()
+                day_energy = retry(
+                    lambda: s.get_readings(date_srt, end_date_srt), 
+                    exceptions=Energy_Interface.RETRY_EXCEPTIONS, 
+                    retryable=Energy_Interface.retryable
+                )
+                frames.append(readings_to_df(day_energy))
         except Exception as E:
             print("!!!!!\n", E)  
         finally:
-            del(s)
+            s.close()
+        # keep windows fetched before error
+        if frames:
+            temp_df = pd.concat(frames, ignore_index=True)
+            temp_df.date = temp_df.date - timedelta(hours=1)
+            self.append_df(temp_df)
+            self.save_to_file()
         if self.debug:
             print(f'{self.source_name}\nTotal import energy: {self.get_energy.import_.sum():,.2f} wh\nTotal export energy: {self.get_energy.export_.sum():,.2f} wh')
         return
\ No newline at end of file
@@ -1,3 +1,5 @@
+import io
+
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -7,6 +9,25 @@ from .my_graph_speedo import speedometer
 
 STD_COLORRANGE = ['blue', 'orange', 'green', 'gray', 'yellow']
 
+def show_or_buffer(fig, filename='', save_png=False):
+    #
+    #   own figure of plot: filename - rendered to png in memory (returned BytesIO, see PDF.image),
+    #   save_png - written to filename.png too, no filename - shown. figure is always closed
+    #
+    try:
+        if not filename:
+            plt.show()
+            return None
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        if save_png:
+            with open('{}.png'.format(filename), 'wb') as file:
+                file.write(buffer.getvalue())
+        buffer.seek(0)
+        return buffer
+    finally:
+        plt.close(fig)
+
 def simple_data_preparation(
     df, 
     group_by, 
@@ -18,7 +39,11 @@ def simple_data_preparation(
     unit='', 
     multipliy=1,
     mean=False,
+    cube=None,
 ):
+    #
+    #   cube - RollupCube with pre-aggregated data, used instead of groupby when it has group_by level
+    #
     new_fill = fill
     new_colors = colors
     if filter:
@@ -44,11 +69,17 @@ def simple_data_preparation(
                 group_df[item + "-" + series + "%"] = group_df[item + "-" + series] / group_df["mean-" + series] * 100
         series_to_plot = [col for col in group_df.columns if not col.endswith("%")]
     else:
-        group_df = df.groupby(group_by)[series_to_plot].agg(agg).reset_index() if group_by else df
+        if cube is not None and group_by and cube.has(group_by, agg, series_to_plot):
+            group_df = cube.get(group_by, agg, series_to_plot)
+        else:
+            group_df = df.groupby(group_by)[series_to_plot].agg(agg).reset_index() if group_by else df
         if mean:
             # group_df['mean'] = np.mean(group_df[series_to_plot])
             # series_to_plot += 'mean'
-            mean_df = df.groupby(group_by)[series_to_plot].mean().reset_index()
+            if cube is not None and cube.has(group_by, 'mean', series_to_plot):
+                mean_df = cube.get(group_by, 'mean', series_to_plot)
+            else:
+                mean_df = df.groupby(group_by)[series_to_plot].mean().reset_index()
             for col in mean_df.columns[1:]:
                 mean_df.rename(columns = {col: "mean_" + col}, inplace=True )
             
@@ -67,9 +98,13 @@ def barplot(
     multiply=1, 
     mean=False, 
     ax=None,
+    cube=None,
     figsize=(8,4),
+    save_png=False,
 ):
+    own_ax = False
     if not ax:
+        own_ax = True
         fig, ax = plt.subplots(figsize=figsize, dpi=200)
         fig.tight_layout()
     group_df, series_to_plot, colors, fill  = simple_data_preparation(
@@ -80,7 +115,8 @@ def barplot(
         fill=fill, 
         agg=agg, 
         filter=filter, 
-        mean=mean
+        mean=mean,
+        cube=cube
     )
     for idx, item in enumerate(series_to_plot):
         ax.bar(
@@ -99,10 +135,8 @@ def barplot(
     ax.grid(True, ls=":")
     ax.set_ylabel(unit,fontsize='xx-small')
     ax.set_xlabel(group_by,fontsize='xx-small')
-    if filename:
-        plt.savefig('{}.png'.format(filename), bbox_inches='tight')
-    else:
-        plt.show()
+    if own_ax:
+        return show_or_buffer(ax.figure, filename, save_png)
     return
 
 def histplot(
@@ -115,9 +149,13 @@ def histplot(
     unit='', 
     multiply=1, 
     mean=False, 
-    ax=None
+    ax=None,
+    cube=None,
+    save_png=False,
 ):
+    own_ax = False
     if not ax:
+        own_ax = True
         fig, ax = plt.subplots(figsize=(8,4), dpi=200)
         fig.tight_layout()
     group_df, series_to_plot, colors, fill  = simple_data_preparation(
@@ -128,7 +166,8 @@ def histplot(
         fill=fill, 
         agg=agg, 
         filter=filter, 
-        mean=mean
+        mean=mean,
+        cube=cube
     )
     for idx, item in enumerate(series_to_plot):
         ax.hist(
@@ -148,11 +187,9 @@ def histplot(
     ax.tick_params(axis='x', rotation=90)
     ax.set_ylabel(unit,fontsize='xx-small')
     ax.set_xlabel(group_by,fontsize='xx-small')
-    if filename:
-        plt.savefig('{}.png'.format(filename), bbox_inches='tight')
-    else:
-        plt.show()
-    return 
+    if own_ax:
+        return show_or_buffer(ax.figure, filename, save_png)
+    return
     
 def lineplot(
     df, group_by, series_to_plot, 
@@ -167,7 +204,9 @@ def lineplot(
     mean=False,
     title='',
     ax=None,
+    cube=None,
     figsize=(8,4),
+    save_png=False,
 ):
     own_ax = False
     if not ax:
@@ -184,7 +223,8 @@ def lineplot(
         fill=fill, 
         agg=agg, 
         filter=filter, 
-        mean=mean
+        mean=mean,
+        cube=cube
     )
     for item in fill_between.keys():
         ax.fill_between(
@@ -215,13 +255,52 @@ def lineplot(
     ax.set_ylabel(unit,fontsize='xx-small')
     ax.set_xlabel(group_by,fontsize='xx-small')
     if own_ax:
-        if filename:
-            plt.savefig('{}.png'.format(filename), bbox_inches='tight')
-        else:
-            plt.show()
-    return 
+        return show_or_buffer(ax.figure, filename, save_png)
+    return
 
-def set_of_speedo(stat_df, filename=''):
+def heatmap(
+    df, x, y, value,
+    unit='',
+    title='',
+    filename='',
+    cmap='RdYlGn',
+    ax=None,
+    figsize=(8,4),
+    save_png=False,
+):
+    #
+    #   df - tidy frame (one row per x, y pair), value shown as color (e.g. sweep results)
+    #
+    own_ax = False
+    if not ax:
+        fig, ax = plt.subplots(figsize=figsize, dpi=200)
+        fig.tight_layout()
+        own_ax = True
+    ax.set_title(title, fontsize='x-small')
+    pivot_df = df.pivot_table(index=y, columns=x, values=value).sort_index(ascending=False)
+    pivot_df.index = ['{:.2f}'.format(item) for item in pivot_df.index]
+    pivot_df.columns = ['{:.2f}'.format(item) for item in pivot_df.columns]
+    sns.heatmap(
+        pivot_df, 
+        ax=ax, 
+        cmap=cmap, 
+        annot=bool(pivot_df.size <= 100), 
+        fmt=',.0f', 
+        annot_kws={'fontsize': 'xx-small'},
+        cbar_kws={'label': unit},
+        xticklabels='auto', 
+        yticklabels='auto',
+    )
+    ax.figure.axes[-1].tick_params(labelsize="xx-small")
+    ax.figure.axes[-1].yaxis.label.set_size('xx-small')
+    ax.tick_params(axis='both', which='major', labelsize="xx-small")
+    ax.set_ylabel(y.replace('_', ' '), fontsize='xx-small')
+    ax.set_xlabel(x.replace('_', ' '), fontsize='xx-small')
+    if own_ax:
+        return show_or_buffer(ax.figure, filename, save_png)
+    return
+
+def set_of_speedo(stat_df, filename='', save_png=False):
     no_of_measures = stat_df['mean'].count()
     weight, hight = 6, 5 / no_of_measures
     columns = stat_df['index'].tolist()
@@ -250,11 +329,7 @@ def set_of_speedo(stat_df, filename=''):
             annotation_offset=0.6, annotation_pad=0.5,
             fade_alpha=0.9,
         )
-    if filename:
-        plt.savefig('{}.png'.format(filename), bbox_inches='tight')
-    else:
-        plt.show()
-    return
+    return show_or_buffer(fig, filename, save_png)
 
 
 def swarmplot(
@@ -270,15 +345,11 @@ def swarmplot(
     mean=False,
     title='',
     ax=None,
+    cube=None,
     dotsize=2,
     figsize=(8,4),
+    save_png=False,
 ):
-    own_ax = False
-    if not ax:
-        fig, ax = plt.subplots(figsize=figsize, dpi=200)
-        # fig.tight_layout()
-        ax.set_title(title, fontsize='x-small')
-        own_ax = True
     group_df, series_to_plot, colors, fill  = simple_data_preparation(
         df=df, 
         group_by=group_by, 
@@ -287,25 +358,30 @@ def swarmplot(
         fill=fill, 
         agg=agg, 
         filter=filter, 
+        cube=cube,
     )
     df = pd.DataFrame()
     for col in series_to_plot:
         temp_df = group_df[[group_by, col]].rename(columns={col: 'value'})
         temp_df['category'] = np.array([col.replace("_", " ")] * len(group_df.index.to_list()))
         df = pd.concat([df, temp_df])
-    sns.set_theme(style="whitegrid", palette="muted")
-    sns.swarmplot(data=df, x="value",  y="category", s=dotsize, ax=ax) # orient='v'
+    own_ax = False
+    # style only of this chart (set_theme changed all next charts of process)
+    with sns.axes_style("whitegrid"), sns.color_palette("muted"):
+        if not ax:
+            fig, ax = plt.subplots(figsize=figsize, dpi=200)
+            # fig.tight_layout()
+            ax.set_title(title, fontsize='x-small')
+            own_ax = True
+        sns.swarmplot(data=df, x="value",  y="category", s=dotsize, ax=ax) # orient='v'
     ax.set_ylabel("", fontsize="xx-small")
     ax.set_xlabel(unit, fontsize="xx-small")
     ax.legend(fontsize='xx-small',  loc='best')
     ax.grid(True)
     ax.tick_params(axis='both', which='major', labelsize="xx-small")
     if own_ax:
-        if filename:
-            plt.savefig('{}.png'.format(filename), bbox_inches='tight')
-        else:
-            plt.show()
-    return 
+        return show_or_buffer(ax.figure, filename, save_png)
+    return
     
     
 
@@ -0,0 +1,101 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+
+def use_agg():
+    # worker process: no GUI, figures are only saved
+    matplotlib.use('Agg')
+
+
+def render_chart(function, args, kwargs):
+    #
+    #   chart spec: plot function (my_plots) with its data and params, figures are closed after save
+    #
+    import matplotlib.pyplot as plt
+    try:
+        return function(*args, **kwargs)
+    finally:
+        plt.close('all')
+
+
+class DeferredPDF:
+    '''
+    pdf stand-in recording page layout calls (LAYOUT), they are replayed on pdf when all charts are rendered.
+    other attributes and methods (get_y, page_no, get_string_width, ...) are taken from pdf - they see
+    pdf state before replay, page code must not depend on them
+    '''
+    LAYOUT = {
+        'add_page', 'cell', 'multi_cell', 'write', 'ln', 'image', 'line', 'rect', 'text',
+        'set_font', 'set_font_size', 'set_fill_color', 'set_draw_color', 'set_text_color', 'set_line_width',
+        'set_x', 'set_y', 'set_xy',
+    }
+
+    def __init__(self, pdf):
+        self.target = pdf
+        self._calls = []
+
+    def __getattr__(self, name):
+        if name not in self.LAYOUT:
+            return getattr(self.target, name)
+
+        def record(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+        return record
+
+    def replay(self):
+        calls, self._calls = self._calls, []
+        for name, args, kwargs in calls:
+            getattr(self.target, name)(*args, **kwargs)
+
+
+class RenderScheduler:
+    '''
+    charts of report pages rendered in process pool (Agg backend).
+    pages submit chart specs and lay out pdf (recorded by DeferredPDF),
+    on wait() / exit all images (png buffers) are collected and added to pdf, then pdf pages are laid out in order.
+    usage:
+        with RenderScheduler(pdf, workers=8) as render:
+            energy.daily_flash_page(pdf=render.pdf, render=render)
+            energy.group_report_pages(pdf=render.pdf, render=render)
+    workers 1 - charts are rendered one by one in this process
+    '''
+    def __init__(self, pdf=None, workers=None):
+        self.workers = workers or os.cpu_count()
+        self.pdf = DeferredPDF(pdf) if pdf is not None else None
+        self.pool = ProcessPoolExecutor(self.workers, initializer=use_agg) if self.workers > 1 else None
+        self.futures = []
+
+    def submit(self, function, *args, **kwargs):
+        if self.pool is None:
+            self.add_png(kwargs.get('filename'), render_chart(function, args, kwargs))
+            return
+        self.futures.append((kwargs.get('filename'), self.pool.submit(render_chart, function, args, kwargs)))
+
+    def add_png(self, filename, buffer):
+        # chart image is used by pdf.image(filename + '.png')
+        if self.pdf is not None and filename and buffer is not None:
+            self.pdf.target.add_png(filename + '.png', buffer)
+
+    def wait(self):
+        futures, self.futures = self.futures, []
+        for filename, future in futures:
+            self.add_png(filename, future.result())
+        if self.pdf is not None:
+            self.pdf.replay()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            self.close()
@@ -14,7 +14,7 @@ def prepare_dataframes(energy_df, projection, pdf = None):
     monthly_energy_df = energy_df.get_energy.groupby('month').sum().reset_index()
     months = monthly_energy_df.month.values.tolist()
     for month_id in [0, -1]:
-        limits = energy_df.get_energy[energy_df.get_energy.month==months[month_id]]['day'].agg(['min', 'max']).values.tolist()
+        limits = energy_df.get_energy[energy_df.get_energy.month==months[month_id]]['day'].agg(['min', 'max']).tolist()
         if limits[0].day==1 and (limits[1]+ timedelta(days=1)).day==1:
             continue
         months.remove(months[month_id])
@@ -68,8 +68,8 @@ def create_monthly_projection(energy_df, projection = 6, pdf=None):
         for msg in savings_msg:
             pdf.cell(100, 6, msg , 0, 1, 'R')
         filename = OUTPUT_DIR + 'projection graph {}-{}'.format(projection_df['month_str'].min().replace('/', ''), projection_df['month_str'].min().replace('/', ''))
-        projection_in_graph(monthly_energy_df, projection_df, filename=filename)
-        pdf.image(filename+'.png', None, None, 200, 100, type='PNG')
+        buffer = projection_in_graph(monthly_energy_df, projection_df, filename=filename, save_png=energy_df.save_png)
+        pdf.image(buffer, None, None, 200, 100, type='PNG')
     else:
         projection_in_graph(monthly_energy_df, projection_df, filename='')
     return monthly_energy_df, projection_df
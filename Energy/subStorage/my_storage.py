@@ -0,0 +1,494 @@
+import json
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+
+def date_range(temp_df, start=None, stop=None):
+    if start is not None:
+        temp_df = temp_df[temp_df['date'] >= start]
+    if stop is not None:
+        temp_df = temp_df[temp_df['date'] < stop]
+    return temp_df
+
+def merge_by_date(stored_df, temp_df):
+    if stored_df is None or stored_df.empty:
+        return temp_df
+    stored_df = stored_df[~stored_df['date'].isin(temp_df['date'])]
+    return pd.concat([stored_df, temp_df], ignore_index=True).sort_values('date', kind='mergesort')
+
+
+class Storage(ABC):
+    '''
+    storage backend of one energy source.
+    keeps only raw columns (date, energy columns, source, direction),
+    derived columns are recalculated by Energy after load.
+    FileStorage - backends written by pandas writers, others write own format (save / upsert)
+    INCREMENTAL - backend writes only changed rows (upsert), others rewrite whole file
+    LAZY - load is cheap to postpone, Energy materializes data on first use
+    '''
+    name = 'master'
+    ext = ''
+    INCREMENTAL = False
+    LAZY = False
+    VALUE_COLUMNS = ['production_', 'export_', 'import_']
+    CONSTANT_COLUMNS = ['source', 'direction']
+    def __init__(self, storage_dir, source_name):
+        self.storage_dir = storage_dir
+        self.source_name = source_name
+
+    @property
+    def path(self):
+        return '{}{}.{}'.format(self.storage_dir, self.source_name, self.ext)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @abstractmethod
+    def load(self, columns=None, start=None, stop=None):
+        #
+        #   columns - projection, 'date' is always read
+        #   start, stop - date range [start, stop)
+        #
+        pass
+
+    @staticmethod
+    def projection(columns):
+        return ['date'] + [col for col in columns if col != 'date'] if columns else None
+
+    @abstractmethod
+    def save(self, temp_df):
+        pass
+
+    def upsert(self, temp_df):
+        # rows with the same timestamp are replaced
+        self.save(merge_by_date(self.load() if self.exists() else None, temp_df))
+
+    def last_date(self):
+        # last stored timestamp, None - nothing stored
+        if not self.exists():
+            return None
+        dates = self.load(['date'])['date']
+        return dates.max() if not dates.empty else None
+
+
+class FileStorage(Storage):
+    '''
+    data file read / written by pandas (_read / _write of file path)
+    '''
+    def load(self, columns=None, start=None, stop=None):
+        if not self.exists():
+            raise FileNotFoundError(self.path)
+        return date_range(self._read(self.path, self.projection(columns)), start, stop)
+
+    def save(self, temp_df):
+        # write to temporary file and replace, reader never sees half written file
+        self._replace(self.path, temp_df)
+
+    def _replace(self, path, temp_df):
+        temp_path = path + '.tmp'
+        self._write(temp_df.reset_index(drop=True), temp_path)
+        os.replace(temp_path, path)
+
+    @abstractmethod
+    def _read(self, path, columns):
+        pass
+
+    @abstractmethod
+    def _write(self, temp_df, path):
+        pass
+
+
+class CSVStorage(FileStorage):
+    name = 'csv'
+    ext = 'csv'
+    def _read(self, path, columns):
+        # files saved by older versions have index column and all derived columns
+        usecols = (lambda col: col in columns) if columns else (lambda col: not col.startswith('Unnamed'))
+        return pd.read_csv(path, usecols=usecols, parse_dates=['date'])
+
+    def _write(self, temp_df, path):
+        temp_df.to_csv(path, index=False)
+
+
+class ParquetStorage(FileStorage):
+    name = 'parquet'
+    ext = 'parquet'
+    def _read(self, path, columns):
+        return pd.read_parquet(path, columns=columns)
+
+    def _write(self, temp_df, path):
+        temp_df.to_parquet(path, index=False)
+
+
+class FeatherStorage(FileStorage):
+    name = 'feather'
+    ext = 'feather'
+    def _read(self, path, columns):
+        return pd.read_feather(path, columns=columns)
+
+    def _write(self, temp_df, path):
+        temp_df.to_feather(path)
+
+
+class PartitionedStorage(FileStorage):
+    '''
+    one parquet file per month: <storage_dir><source>/<YYYY-MM>.parquet
+    save / upsert rewrite only months present in data, load reads only months overlapping start - stop
+    '''
+    name = 'partitioned'
+    ext = 'parquet'
+    INCREMENTAL = True
+
+    @property
+    def path(self):
+        return '{}{}/'.format(self.storage_dir, self.source_name)
+
+    def partition_file(self, month):
+        return '{}{}.{}'.format(self.path, month, self.ext)
+
+    @property
+    def partitions(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(f[:-len(self.ext) - 1] for f in os.listdir(self.path) if f.endswith('.' + self.ext))
+
+    def exists(self):
+        return bool(self.partitions)
+
+    def load(self, columns=None, start=None, stop=None):
+        if not self.exists():
+            raise FileNotFoundError(self.path)
+        first = pd.Timestamp(start).strftime('%Y-%m') if start is not None else ''
+        last = pd.Timestamp(stop - pd.Timedelta(1)).strftime('%Y-%m') if stop is not None else '9999-99'
+        frames = [
+            self._read(self.partition_file(month), self.projection(columns))
+            for month in self.partitions if first <= month <= last
+        ]
+        if not frames:
+            return self._read(self.partition_file(self.partitions[-1]), self.projection(columns)).iloc[:0]
+        return date_range(pd.concat(frames, ignore_index=True), start, stop)
+
+    def _month_groups(self, temp_df):
+        return temp_df.groupby(temp_df['date'].dt.strftime('%Y-%m'), sort=True)
+
+    def save(self, temp_df):
+        os.makedirs(self.path, exist_ok=True)
+        for month, month_df in self._month_groups(temp_df):
+            self._replace(self.partition_file(month), month_df)
+
+    def upsert(self, temp_df):
+        os.makedirs(self.path, exist_ok=True)
+        partitions = self.partitions
+        for month, month_df in self._month_groups(temp_df):
+            stored_df = self._read(self.partition_file(month), None) if month in partitions else None
+            self._replace(self.partition_file(month), merge_by_date(stored_df, month_df))
+
+    def last_date(self):
+        # only last month is read
+        if not self.exists():
+            return None
+        dates = self._read(self.partition_file(self.partitions[-1]), ['date'])['date']
+        return dates.max() if not dates.empty else None
+
+    def _read(self, path, columns):
+        return pd.read_parquet(path, columns=columns)
+
+    def _write(self, temp_df, path):
+        temp_df.to_parquet(path, index=False)
+
+
+class HourlyArrayStorage(Storage):
+    '''
+    dense hourly series - one slot per hour from origin (first stored hour):
+    <storage_dir><source>.hourly/ keeps meta.json (origin, stride, length, source, direction),
+    one float64 file per energy column (<col>.f8) and bitmap of hours with data (valid.bits).
+    arrays() - memory mapped views of date range, sliced without copy and without parsing,
+    load() - frame of hours with data built from these views (LAZY - Energy reads it on first use),
+    upsert writes changed slots in place
+    '''
+    name = 'hourly'
+    ext = 'hourly'
+    INCREMENTAL = True
+    LAZY = True
+    STRIDE = pd.Timedelta(hours=1)
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def exists(self):
+        return os.path.exists(self.file('meta.json'))
+
+    @property
+    def meta(self):
+        with open(self.file('meta.json'), 'r') as file:
+            return json.load(file)
+
+    def _write_meta(self, meta):
+        # written last - readers never see length longer than arrays
+        with open(self.file('meta.json.tmp'), 'w') as file:
+            json.dump(meta, file)
+        os.replace(self.file('meta.json.tmp'), self.file('meta.json'))
+
+    def _memmap(self, name, dtype, length, mode='r'):
+        if not length:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.file(name), dtype=dtype, mode=mode, shape=(length,))
+
+    def _bits(self, length, mode='r'):
+        return self._memmap('valid.bits', np.uint8, (length + 7) // 8, mode)
+
+    def slot(self, meta, timestamp, ceil=False):
+        # hour offset of timestamp from origin, clipped to stored range
+        delta = pd.Timestamp(timestamp) - pd.Timestamp(meta['origin'])
+        slot = -(-delta // self.STRIDE) if ceil else delta // self.STRIDE
+        return int(min(max(slot, 0), meta['length']))
+
+    def _slots(self, meta, dates):
+        offsets = (dates.to_numpy(dtype='datetime64[ns]') - np.datetime64(meta['origin'], 'ns')).astype('int64')
+        if (offsets % self.STRIDE.value).any():
+            raise ValueError("{} - only hourly data can be kept in '{}' storage".format(self.source_name, self.name))
+        return offsets // self.STRIDE.value
+
+    def arrays(self, start=None, stop=None, meta=None):
+        #
+        #   views of stored hours [start, stop): dates, {column: memory mapped array}, valid hours mask
+        #
+        meta = meta or self.meta
+        first = self.slot(meta, start) if start is not None else 0
+        last = self.slot(meta, stop, ceil=True) if stop is not None else meta['length']
+        last = max(first, last)
+        dates = pd.date_range(pd.Timestamp(meta['origin']) + first * self.STRIDE, periods=last - first, freq=self.STRIDE)
+        values = {col: self._memmap(col + '.f8', np.float64, meta['length'])[first:last] for col in self.VALUE_COLUMNS}
+        bits = self._bits(meta['length'])[first // 8:(last + 7) // 8]
+        valid = np.unpackbits(bits)[first % 8:first % 8 + last - first].astype(bool)
+        return dates, values, valid
+
+    def load(self, columns=None, start=None, stop=None):
+        if not self.exists():
+            raise FileNotFoundError(self.path)
+        meta = self.meta
+        columns = self.projection(columns) or ['date'] + self.CONSTANT_COLUMNS + self.VALUE_COLUMNS
+        dates, values, valid = self.arrays(start, stop, meta)
+        temp_df = pd.DataFrame({'date': dates[valid]})
+        for col in columns[1:]:
+            temp_df[col] = meta[col] if col in self.CONSTANT_COLUMNS else np.asarray(values[col][valid])
+        return temp_df
+
+    def last_date(self):
+        # last hour marked in valid bitmap
+        if not self.exists():
+            return None
+        meta = self.meta
+        slots = np.flatnonzero(np.unpackbits(self._bits(meta['length']))[:meta['length']])
+        return pd.Timestamp(meta['origin']) + int(slots[-1]) * self.STRIDE if slots.size else None
+
+    def save(self, temp_df):
+        os.makedirs(self.path, exist_ok=True)
+        origin = temp_df['date'].min().floor(self.STRIDE) if not temp_df.empty else pd.Timestamp(0)
+        meta = {
+            'origin': origin.isoformat(),
+            'stride': int(self.STRIDE.total_seconds()),
+            'length': int((temp_df['date'].max() - origin) // self.STRIDE) + 1 if not temp_df.empty else 0,
+        }
+        for col in self.CONSTANT_COLUMNS:
+            meta[col] = str(temp_df[col].iloc[0]) if col in temp_df.columns and not temp_df.empty else 'None'
+        slots = self._slots(meta, temp_df['date'])
+        for col in self.VALUE_COLUMNS:
+            values = np.zeros(meta['length'], dtype=np.float64)
+            if col in temp_df.columns:
+                values[slots] = temp_df[col].to_numpy(dtype=np.float64)
+            self._replace(col + '.f8', values)
+        valid = np.zeros(meta['length'], dtype=bool)
+        valid[slots] = True
+        self._replace('valid.bits', np.packbits(valid))
+        self._write_meta(meta)
+
+    def _replace(self, name, values):
+        values.tofile(self.file(name + '.tmp'))
+        os.replace(self.file(name + '.tmp'), self.file(name))
+
+    def upsert(self, temp_df):
+        if temp_df.empty:
+            return
+        if not self.exists():
+            return self.save(temp_df)
+        meta = self.meta
+        if temp_df['date'].min() < pd.Timestamp(meta['origin']):
+            # origin moves - all slots shift
+            return self.save(merge_by_date(self.load(), temp_df))
+        slots = self._slots(meta, temp_df['date'])
+        length = max(meta['length'], int(slots.max()) + 1)
+        for col in self.VALUE_COLUMNS:
+            self._resize(col + '.f8', length * 8)
+            if col in temp_df.columns:
+                values = self._memmap(col + '.f8', np.float64, length, 'r+')
+                values[slots] = temp_df[col].to_numpy(dtype=np.float64)
+                values.flush()
+        self._resize('valid.bits', (length + 7) // 8)
+        bits = self._bits(length, 'r+')
+        first, last = slots.min() // 8, slots.max() // 8 + 1
+        valid = np.unpackbits(bits[first:last])
+        valid[slots - first * 8] = 1
+        bits[first:last] = np.packbits(valid)
+        bits.flush()
+        meta['length'] = length
+        self._write_meta(meta)
+
+    def _resize(self, name, size):
+        # new slots are filled with zeros (and marked as missing)
+        with open(self.file(name), 'ab') as file:
+            if file.tell() < size:
+                file.truncate(size)
+
+
+class SQLiteStorage(Storage):
+    '''
+    all sources in one database <storage_dir>energy.sqlite, one table per source
+    keyed on (source, direction, date), date indexed.
+    WAL journal - report processes read while refresh writes, upsert is INSERT ... ON CONFLICT.
+    aggregate - group query run by sqlite, data is not loaded to pandas
+    '''
+    name = 'sqlite'
+    ext = 'sqlite'
+    INCREMENTAL = True
+    LAZY = True
+    DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+    # group columns of Energy as sql expressions (week - %W of monday, week 00 belongs to previous year)
+    GROUP_KEYS = {
+        'hour': "CAST(strftime('%H', date) AS INTEGER)",
+        'day': 'date(date)',
+        'week': "strftime('%Y/%W', date(date, '-6 days', 'weekday 1'))",
+        'month': "strftime('%Y/%m', date)",
+        'year': "strftime('%Y', date)",
+    }
+    SQL_AGG = {'sum': 'SUM', 'mean': 'AVG', 'min': 'MIN', 'max': 'MAX', 'count': 'COUNT'}
+
+    @property
+    def path(self):
+        return '{}energy.{}'.format(self.storage_dir, self.ext)
+
+    @property
+    def table(self):
+        return '"{}"'.format(self.source_name.replace('"', '""'))
+
+    @contextmanager
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=60)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            yield connection
+        finally:
+            connection.close()
+
+    def exists(self):
+        if not os.path.exists(self.path):
+            return False
+        with self.connect() as connection:
+            return connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (self.source_name,)
+            ).fetchone() is not None
+
+    def _create(self, connection):
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS {} (source TEXT NOT NULL, direction TEXT NOT NULL, date TEXT NOT NULL, {}, '
+            'PRIMARY KEY (source, direction, date))'.format(
+                self.table, ', '.join('{} REAL NOT NULL DEFAULT 0'.format(col) for col in self.VALUE_COLUMNS))
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS "{}_date" ON {} (date)'.format(
+            self.source_name.replace('"', '""'), self.table))
+
+    def _where(self, start=None, stop=None):
+        conditions, params = [], []
+        if start is not None:
+            conditions.append('date >= ?')
+            params.append(pd.Timestamp(start).strftime(self.DATE_FORMAT))
+        if stop is not None:
+            conditions.append('date < ?')
+            params.append(pd.Timestamp(stop).strftime(self.DATE_FORMAT))
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def load(self, columns=None, start=None, stop=None):
+        if not self.exists():
+            raise FileNotFoundError(self.path)
+        columns = self.projection(columns) or ['date'] + self.CONSTANT_COLUMNS + self.VALUE_COLUMNS
+        where, params = self._where(start, stop)
+        with self.connect() as connection:
+            temp_df = pd.read_sql_query(
+                'SELECT {} FROM {}{} ORDER BY date'.format(', '.join(columns), self.table, where),
+                connection, params=params
+            )
+        temp_df['date'] = pd.to_datetime(temp_df['date'], format=self.DATE_FORMAT)
+        return temp_df
+
+    def last_date(self):
+        if not self.exists():
+            return None
+        with self.connect() as connection:
+            last_date = connection.execute('SELECT MAX(date) FROM {}'.format(self.table)).fetchone()[0]
+        return pd.Timestamp(last_date) if last_date is not None else None
+
+    def aggregate(self, group_by, agg='sum', start=None, stop=None, columns=None, count=False):
+        #
+        #   group_by - Energy group columns (GROUP_KEYS), [] - one row of whole range,
+        #   agg - SQL_AGG, [start, stop) date range, count - number of rows too (count column)
+        #
+        columns = columns or self.VALUE_COLUMNS
+        where, params = self._where(start, stop)
+        select = ['{} AS {}'.format(self.GROUP_KEYS[key], key) for key in group_by]
+        select += ['{}({}) AS {}'.format(self.SQL_AGG[agg], col, col) for col in columns]
+        select += ['COUNT(*) AS count'] if count else []
+        keys = ', '.join(str(idx + 1) for idx in range(len(group_by)))
+        with self.connect() as connection:
+            temp_df = pd.read_sql_query(
+                'SELECT {} FROM {}{}{}'.format(
+                    ', '.join(select), self.table, where, ' GROUP BY {} ORDER BY {}'.format(keys, keys) if keys else ''),
+                connection, params=params
+            )
+        if 'day' in group_by:
+            temp_df['day'] = pd.to_datetime(temp_df['day'])
+        return temp_df
+
+    def _rows(self, temp_df):
+        columns = [
+            temp_df[col].astype(str) if col in temp_df.columns else [self.source_name if col == 'source' else 'None'] * len(temp_df.index)
+            for col in self.CONSTANT_COLUMNS
+        ]
+        columns.append(temp_df['date'].dt.strftime(self.DATE_FORMAT))
+        columns += [
+            temp_df[col].astype(float) if col in temp_df.columns else [0.0] * len(temp_df.index)
+            for col in self.VALUE_COLUMNS
+        ]
+        return zip(*(list(col) for col in columns))
+
+    def _insert(self, connection, temp_df, upsert=False):
+        columns = self.CONSTANT_COLUMNS + ['date'] + self.VALUE_COLUMNS
+        connection.executemany(
+            'INSERT INTO {} ({}) VALUES ({}){}'.format(
+                self.table, ', '.join(columns), ', '.join('?' * len(columns)),
+                ' ON CONFLICT (source, direction, date) DO UPDATE SET {}'.format(
+                    ', '.join('{0} = excluded.{0}'.format(col) for col in self.VALUE_COLUMNS)) if upsert else ''),
+            self._rows(temp_df)
+        )
+
+    def save(self, temp_df):
+        # one transaction - readers see old or new data
+        with self.connect() as connection:
+            with connection:
+                self._create(connection)
+                connection.execute('DELETE FROM {}'.format(self.table))
+                self._insert(connection, temp_df)
+
+    def upsert(self, temp_df):
+        with self.connect() as connection:
+            with connection:
+                self._create(connection)
+                self._insert(connection, temp_df, upsert=True)
+
+
+STORAGE_BACKENDS = {i.name: i for i in FileStorage.__subclasses__() + Storage.__subclasses__() if i is not FileStorage}
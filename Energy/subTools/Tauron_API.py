@@ -1,9 +1,41 @@
 from datetime import datetime, timedelta
+import os
+import pickle
+import threading
 import pandas as pd
 import requests
 from urllib3 import poolmanager
 import ssl
 
+READINGS_SERIES = {
+    'chart': 'import_',  # energy taken from grid
+    'OZE': 'export_',  # energy given back to grid
+}
+
+def _readings_series(data, column):
+    #
+    #   e-licznik list of {Date, Hour, EC, Extra} -> DataFrame [date, column]
+    #   Hour 1..24 closes the hour, timestamp = Date + Hour.
+    #   "Extra" = "T" marks second 2 AM - 3 AM hour when switching from CEST to CET (e.g. 2021-10-31);
+    #   local time is naive, so both readings are summed into one timestamp and the day total is kept.
+    #
+    frame = pd.DataFrame.from_records(data, columns=['Date', 'Hour', 'EC'])
+    temp_df = pd.DataFrame({
+        'date': pd.to_datetime(frame['Date'], format="%Y-%m-%d") + pd.to_timedelta(frame['Hour'].astype(int), unit='h'),
+        column: pd.to_numeric(frame['EC']).astype(float),
+    })
+    if temp_df['date'].duplicated().any():
+        temp_df = temp_df.groupby('date', as_index=False, sort=False)[column].sum()
+    return temp_df
+
+def readings_to_df(data):
+    #
+    #   "dane" part of chart response -> DataFrame [date, import_, export_] sorted by date
+    #
+    import_df, export_df = (_readings_series(data.get(key, []), column) for key, column in READINGS_SERIES.items())
+    temp_df = pd.merge(import_df, export_df, on='date', how='outer', sort=True)
+    return temp_df[['date'] + list(READINGS_SERIES.values())].fillna(0)
+
 class TLSAdapter(requests.adapters.HTTPAdapter):
     def init_poolmanager(self, connections, maxsize, block=False):
         """Create and initialize the urllib3 PoolManager."""
@@ -18,22 +50,35 @@ class TLSAdapter(requests.adapters.HTTPAdapter):
         )
         
 class Session(requests.Session):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, pool_size=10, **kwargs):
         super().__init__(*args, **kwargs)
-        self.mount("https://", TLSAdapter())
+        self.mount("https://", TLSAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
 
 class TauronAPI:
     SERVICE_URL = "https://elicznik.tauron-dystrybucja.pl"
     LOGIN_URL = "https://logowanie.tauron-dystrybucja.pl/login"
     CHART_URL = "https://elicznik.tauron-dystrybucja.pl/index/charts"
     
-    def __init__(self, username, password, meter_id):
+    def __init__(self, username, password, meter_id, cookie_file=None, pool_size=10, cache=None):
         self.username = username
         self.password = password
         self.meter_id = meter_id
+        self.cookie_file = cookie_file  # authenticated cookie jar reused between runs
+        self.pool_size = pool_size
+        self.cache = cache  # ResponseCache or None
+        self.session = None
+        self.lock = threading.Lock()
+        self.logins = 0  # SSO logins done by this object
         
     def login(self):
-        self.session = Session()
+        # reuse stored cookies, full SSO login only when there is no valid one
+        self.session = Session(pool_size=self.pool_size)
+        if not self.load_cookies():
+            self.sso_login()
+
+    def sso_login(self):
+        self.logins += 1
+        self.session.cookies.clear()
         self.session.get(self.LOGIN_URL)
         self.session.post(
             self.LOGIN_URL,
@@ -43,15 +88,42 @@ class TauronAPI:
                 "service": self.SERVICE_URL,
             },
         )
+        self.save_cookies()
+
+    def load_cookies(self):
+        if not self.cookie_file or not os.path.exists(self.cookie_file):
+            return False
+        try:
+            with open(self.cookie_file, 'rb') as file:
+                cookies = pickle.load(file)
+        except (OSError, pickle.PickleError, EOFError):
+            return False
+        cookies.clear_expired_cookies()
+        if not len(cookies):
+            return False
+        self.session.cookies.update(cookies)
+        return True
+
+    def save_cookies(self):
+        if not self.cookie_file:
+            return
+        with open(self.cookie_file, 'wb') as file:
+            pickle.dump(self.session.cookies, file)
+
+    def close(self):
+        if self.session:
+            self.save_cookies()
+            self.session.close()
+            self.session = None
         
     def __enter__(self):
         self.login()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        self.close()
 
-    def get_raw_readings(self, start_date, end_date):
+    def _post_readings(self, start_date, end_date):
         return self.session.post(
             self.CHART_URL,
             data={
@@ -63,21 +135,30 @@ class TauronAPI:
                 "dane[endDay]": end_date.strftime("%d.%m.%Y"),
                 "dane[checkOZE]": "on",
             },
-        ).json()
-    
-    @staticmethod
-    def _extract_values_with_timestamps(data):
-        for element in data:
-            date = element.get("Date")
-            hour = int(element.get("Hour"))
-            value = float(element.get("EC"))
-            # TODO: There's also an "Extra" field, which seems to be set to be set to "T" only for the one extra hour
-            # when switching from CEST to CET (e.g. 3 AM on 2021-10-31)
-            timestamp = datetime.strptime(date, "%Y-%m-%d")
-            timestamp += timedelta(hours=hour)
-            value = element.get("EC")
-            yield timestamp, value
+        )
 
+    def get_raw_readings(self, start_date, end_date):
+        if not self.cache:
+            return self._get_raw_readings(start_date, end_date)
+        return self.cache.fetch(
+            lambda: self._get_raw_readings(start_date, end_date),
+            'Tauron/charts', self.meter_id, start_date, end_date,
+        )
+
+    def _get_raw_readings(self, start_date, end_date):
+        with self.lock:
+            if self.session is None:
+                self.login()
+        logins = self.logins
+        try:
+            return self._post_readings(start_date, end_date).json()
+        except ValueError:
+            # session expired - service answers with login page instead of json
+            with self.lock:
+                if self.logins == logins:  # other thread has not logged in yet
+                    self.sso_login()
+            return self._post_readings(start_date, end_date).json()
+    
     def get_readings(self, start_date, end_date):
         data = self.get_raw_readings(start_date, end_date)
         data = data.get("dane", {})
@@ -0,0 +1,203 @@
+import operator
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda values, value: np.isin(values, list(value)),
+}
+
+
+class Filter(ABC):
+    '''
+    filter expression tree: Cond (column op value) joined by And, Or, Not.
+    mask(df) - vectorized boolean numpy array, no query string parsing.
+        day = (Col('hour') >= 8) & (Col('hour') < 20)
+        night = ~day
+    key - hashable identity of expression, used for caching masks per data version
+    '''
+    @abstractmethod
+    def mask(self, df):
+        pass
+
+    @abstractmethod
+    def columns(self):
+        pass
+
+    @property
+    @abstractmethod
+    def key(self):
+        pass
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def __eq__(self, other):
+        return isinstance(other, Filter) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+class Col:
+    '''
+    column reference, comparison builds Cond: Col('hour') >= 8, Col('month').isin(['2021/08'])
+    '''
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, value):
+        return Cond(self.name, '==', value)
+
+    def __ne__(self, value):
+        return Cond(self.name, '!=', value)
+
+    def __lt__(self, value):
+        return Cond(self.name, '<', value)
+
+    def __le__(self, value):
+        return Cond(self.name, '<=', value)
+
+    def __gt__(self, value):
+        return Cond(self.name, '>', value)
+
+    def __ge__(self, value):
+        return Cond(self.name, '>=', value)
+
+    def isin(self, values):
+        return Cond(self.name, 'in', tuple(values))
+
+    __hash__ = None
+
+
+class Cond(Filter):
+    def __init__(self, column, op, value):
+        if op not in OPS:
+            raise ValueError("no '{}' on avaliable condition list: {}".format(op, list(OPS)))
+        self.column = column
+        self.op = op
+        self.value = tuple(value) if op == 'in' else value
+
+    def mask(self, df):
+        values = df[self.column]
+        if values.dtype == 'category':
+            # condition is evaluated once per category, rows get result by category code
+            codes = values.cat.codes.to_numpy()
+            hits = np.append(self.compare(values.cat.categories), False)  # code -1 (NaN) -> False
+            return hits[codes]
+        return self.compare(values)
+
+    def compare(self, values):
+        value = self.value
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            value = [np.datetime64(pd.Timestamp(item)) for item in value] if self.op == 'in' \
+                else np.datetime64(pd.Timestamp(value))
+        elif pd.api.types.is_numeric_dtype(values.dtype) and isinstance(value, str):
+            value = float(value)
+        return np.asarray(OPS[self.op](np.asarray(values), value), dtype=bool)
+
+    def columns(self):
+        return [self.column]
+
+    @property
+    def key(self):
+        value = str(self.value) if isinstance(self.value, datetime) else self.value
+        return ('cond', self.column, self.op, value)
+
+    def __str__(self):
+        return '{} {} {}'.format(self.column, self.op, list(self.value) if self.op == 'in' else self.value)
+
+
+class And(Filter):
+    NAME = 'and'
+
+    def __init__(self, *children):
+        self.children = children
+
+    def mask(self, df):
+        result = self.children[0].mask(df)
+        for child in self.children[1:]:
+            result = self.combine(result, child.mask(df))
+        return result
+
+    @staticmethod
+    def combine(left, right):
+        return left & right
+
+    def columns(self):
+        return list(dict.fromkeys(col for child in self.children for col in child.columns()))
+
+    @property
+    def key(self):
+        return (self.NAME,) + tuple(child.key for child in self.children)
+
+    def __str__(self):
+        return '(' + ' {} '.format(self.NAME).join(str(child) for child in self.children) + ')'
+
+
+class Or(And):
+    NAME = 'or'
+
+    @staticmethod
+    def combine(left, right):
+        return left | right
+
+
+class Not(Filter):
+    def __init__(self, child):
+        self.child = child
+
+    def mask(self, df):
+        return ~self.child.mask(df)
+
+    def columns(self):
+        return self.child.columns()
+
+    @property
+    def key(self):
+        return ('not', self.child.key)
+
+    def __str__(self):
+        return 'not {}'.format(self.child)
+
+
+def from_dict(filter):
+    #
+    #   legacy filter dict {name: {'Column', 'Condition', 'Value', 'logic_between'}} -> Filter,
+    #   logic_between joins condition with previous one, 'and' binds tighter than 'or' (as in DataFrame.query):
+    #   A or B and C -> A | (B & C)
+    #
+    groups = []
+    for item in filter.values():
+        cond = Cond(item['Column'], item['Condition'].strip(), item['Value'])
+        if groups and item.get('logic_between', 'and').strip().lower() != 'or':
+            groups[-1].append(cond)
+        else:
+            groups.append([cond])
+    terms = [group[0] if len(group) == 1 else And(*group) for group in groups]
+    return terms[0] if len(terms) == 1 else Or(*terms)
+
+
+def as_filter(filter):
+    # Filter, legacy dict or empty (None)
+    if not filter:
+        return None
+    if isinstance(filter, Filter):
+        return filter
+    if isinstance(filter, dict):
+        return from_dict(filter)
+    raise TypeError("filter should be Filter object or filter dict")
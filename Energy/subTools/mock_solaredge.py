@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+MOCK_STEPS = {
+    'QUARTER_OF_AN_HOUR': timedelta(minutes=15),
+    'HOUR': timedelta(hours=1),
+    'DAY': timedelta(days=1),
+}
+
+
+class MockSolarEdge:
+    '''
+    local SolarEdge monitoring API stand-in (dataPeriod and energy endpoints)
+    used to test and benchmark SolarEdge_Interface without touching the real API quota.
+    usage:
+        with MockSolarEdge('2021-08-20', '2022-01-10', latency=0.2) as mock:
+            login_data = {'KEY': 'x', 'ID': 1, 'URL': mock.url}
+    '''
+    def __init__(self, start_date, end_date, latency=0.0, port=0):
+        self.start_date = date.fromisoformat(start_date) if isinstance(start_date, str) else start_date
+        self.end_date = date.fromisoformat(end_date) if isinstance(end_date, str) else end_date
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with mock.lock:
+                    mock.requests += 1
+                time.sleep(mock.latency)
+                url = urlparse(self.path)
+                params = {key: value[0] for key, value in parse_qs(url.query).items()}
+                if url.path.endswith('/dataPeriod'):
+                    body = mock.data_period()
+                elif url.path.endswith('/energy'):
+                    body = mock.energy(params['startDate'], params['endDate'], params.get('timeUnit', 'DAY'))
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def data_period(self):
+        return {'dataPeriod': {'startDate': self.start_date.isoformat(), 'endDate': self.end_date.isoformat()}}
+
+    def energy(self, start_date, end_date, time_unit):
+        step = MOCK_STEPS.get(time_unit, timedelta(days=1))
+        timestamp = datetime.fromisoformat(start_date)
+        stop = datetime.fromisoformat(end_date) + timedelta(days=1)
+        values = []
+        while timestamp < stop:
+            # deterministic day curve, Wh
+            value = max(0.0, float(np.sin((timestamp.hour - 6) / 12 * np.pi))) * 1000 * step / timedelta(hours=1)
+            values.append({'date': timestamp.strftime('%Y-%m-%d %H:%M:%S'), 'value': value})
+            timestamp += step
+        return {'energy': {'timeUnit': time_unit, 'unit': 'Wh', 'values': values}}
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    # benchmark fixed 5 day windows (sequential / concurrent) vs planned windows
+    from Energy import set_debug
+    from Energy.subEnergy.my_energy import Energy
+    from Energy.subEnergy.my_intrerfaces import SolarEdge_Interface
+
+    set_debug(False)
+    with MockSolarEdge('2021-08-20', '2022-01-10', latency=0.2) as mock:
+        login_data = {'KEY': 'mock', 'ID': 1, 'URL': mock.url, 'TIME_UNIT': 'HOUR'}
+        for day_batch, workers in [(5, 1), (5, 3), (None, 1)]:
+            mock.requests = 0
+            start = time.perf_counter()
+            with SolarEdge_Interface(login_data, None, day_batch, Energy.UNITS, workers) as connection:
+                rows = sum(len(df.index) for df in connection.get_dataset())
+            print('day_batch: {}, workers: {}, requests: {}, rows: {}, time: {:.2f} s'.format(
+                day_batch, workers, mock.requests, rows, time.perf_counter() - start))
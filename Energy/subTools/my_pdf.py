@@ -1,6 +1,10 @@
 import os
+import struct
+import zlib
 from datetime import datetime
+
 import fpdf
+import numpy as np
 
 FONTS_DIR = 'font'
 
@@ -48,4 +52,71 @@ class PDF(fpdf.FPDF):
         self.alias_nb_pages()
         self.title=title
         self.set_top_margin(top_margin)
+        self.png_buffers = {}  # name -> in memory png (charts of my_plots)
+
+    def add_png(self, name, buffer):
+        # in memory png used by image(name) instead of file
+        self.png_buffers[name] = buffer
+
+    def image(self, name, *args, **kwargs):
+        #
+        #   name - png / jpg file, name added by add_png or BytesIO with png (type='PNG')
+        #
+        if isinstance(name, str):
+            name = self.png_buffers.get(name, name)
+        return super().image(name, *args, **kwargs)
+
+    def _parsepng(self, name):
+        #
+        #   in memory png (BytesIO) is parsed without disk round trip (fpdf 1.7.2 reads files only),
+        #   alpha channel is split with numpy instead of row by row regex
+        #
+        if isinstance(name, str):
+            return super()._parsepng(name)
+        data = name.getvalue()
+        if data[:8] != b'\x89PNG\r\n\x1a\n' or data[12:16] != b'IHDR':
+            self.error('Not a PNG buffer')
+        w, h, bpc, ct, compression, filter_method, interlacing = struct.unpack('>IIBBBBB', data[16:29])
+        if bpc > 8:
+            self.error('16-bit depth not supported')
+        colspace = {0: 'DeviceGray', 4: 'DeviceGray', 2: 'DeviceRGB', 6: 'DeviceRGB', 3: 'Indexed'}.get(ct)
+        if colspace is None:
+            self.error('Unknown color type')
+        if compression or filter_method or interlacing:
+            self.error('Unknown compression / filter method or interlacing not supported')
+        dp = '/Predictor 15 /Colors {} /BitsPerComponent {} /Columns {}'.format(3 if colspace == 'DeviceRGB' else 1, bpc, w)
+        pal, trns, idat = '', '', []
+        pos = 8
+        while pos < len(data):
+            n, chunk = struct.unpack('>I4s', data[pos:pos + 8])
+            body = data[pos + 8:pos + 8 + n]
+            if chunk == b'PLTE':
+                pal = body
+            elif chunk == b'tRNS':
+                if ct == 0:
+                    trns = [body[1]]
+                elif ct == 2:
+                    trns = [body[1], body[3], body[5]]
+                elif body.find(b'\x00') != -1:
+                    trns = [body.find(b'\x00')]
+            elif chunk == b'IDAT':
+                idat.append(body)
+            elif chunk == b'IEND':
+                break
+            pos += n + 12
+        if colspace == 'Indexed' and not pal:
+            self.error('Missing palette in PNG buffer')
+        info = {'w': w, 'h': h, 'cs': colspace, 'bpc': bpc, 'f': 'FlateDecode', 'dp': dp, 'pal': pal, 'trns': trns}
+        data = b''.join(idat)
+        if ct >= 4:
+            # rows: filter byte + pixels, color and alpha keep filter byte of row
+            channels = 2 if ct == 4 else 4
+            rows = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(h, 1 + channels * w)
+            pixels = rows[:, 1:].reshape(h, w, channels)
+            data = zlib.compress(np.concatenate([rows[:, :1], pixels[:, :, :-1].reshape(h, -1)], axis=1).tobytes())
+            info['smask'] = zlib.compress(np.concatenate([rows[:, :1], pixels[:, :, -1]], axis=1).tobytes())
+            if self.pdf_version < '1.4':
+                self.pdf_version = '1.4'
+        info['data'] = data
+        return info
 
@@ -1,38 +1,17 @@
-from datetime import datetime
 import pandas as pd
 
-def filter_and_group_df(df, filter, group_by, agg='sum', add_avg='' ):
-    file_types = {
-        'year': [str, "'{}'".format],
-        'month': [str, "'{}'".format],
-        'week': [str, "'{}'".format],
-        'hour': [np.int64, int],
-        'direction': [str, "'{}'".format],
-        'date': [datetime, datetime.fromisoformat],
-        'production_': [np.float64, float],
-        'export_': [np.float64, float],
-        'import_': [np.float64, float],
-        'balance_': [np.float64, float],
-        'production_per_panel': [np.float64, float],
-        'self_consumption_': [np.float64, float],
-        'total_consumption_': [np.float64, float],
-        'source_': [str, "'{}'".format],   
-    }
-    numerics = ['int16', 'int32', 'int64', 'float16', 'float32', 'float64']
+from .filters import as_filter
 
-    query = ''
-    filter_name = ''
+def filter_and_group_df(df, filter, group_by, agg='sum', add_avg='', mask=None):
+    #
+    #   filter - Filter expression or legacy filter dict (see filters.from_dict),
+    #   mask - already computed mask of filter (e.g. cached by Energy.mask)
+    #
+    numerics = ['int16', 'int32', 'int64', 'float16', 'float32', 'float64']
+    filter = as_filter(filter)
+    filter_name = str(filter) if filter else ''
     if filter:
-        try:
-            for key, item in filter.items():
-                filter_name += item['logic_between'] if item.get('logic_between', '') else '' + key 
-                if file_types[item['Column']][0]!=type(item['Value']) or file_types[item['Column']][0]==str:
-                    item['Value'] = file_types[item['Column']][1](item['Value'])
-                query += (' ' + item['logic_between'] if item.get('logic_between', '') else '') + ' ' + str(item['Column']) + item['Condition'] + str(item['Value'])
-            query = query.strip().replace("  ", " ")
-            temp_df = df.query(query)
-        except ValueError as E:
-            raise ValueError('EnergyClass filter construction not valid: ' & E)
+        temp_df = df[filter.mask(df) if mask is None else mask]
     else:
         temp_df = df
     if group_by:
@@ -1,5 +1,7 @@
 import matplotlib.pylab as plt
 
+from ..subGraphs.my_plots import show_or_buffer
+
 MODEL_COLUMN = ['%sun', '%midsun', '%cloud', 'avg_temp', 'suntime_minutes']
 PROJECTION_COLUMNS = ['production_', 'self_consumption_level']
 MODEL_NAME = ['energy_production_model.pkl',
@@ -36,9 +38,11 @@ def savings_df_report(df, source_name = '', kWh_cost=0.6, export_back = 0.8, cur
 
 
 
-def projection_in_graph(monthly_energy_df, projection_df, filename = '', ax=None):
+def projection_in_graph(monthly_energy_df, projection_df, filename = '', ax=None, save_png=False):
     if filename: plt.ioff()
+    own_ax = False
     if not ax:
+        own_ax = True
         _, ax = plt.subplots(figsize=(6, 3), dpi=200)
     ax.set_title('Real and Projection Report', fontsize="x-small")
     ax.plot(monthly_energy_df['month_str'], monthly_energy_df['production_'], label = 'production real ', color='blue')
@@ -49,8 +53,6 @@ def projection_in_graph(monthly_energy_df, projection_df, filename = '', ax=None
     plt.yticks(fontsize="xx-small")
     plt.legend(loc="upper center", fontsize="xx-small")
     ax.grid(ls=':')
-    if filename:
-        plt.savefig('{}.png'.format(filename), bbox_inches='tight')
-    else:
-        plt.show()
+    if own_ax:
+        return show_or_buffer(ax.figure, filename, save_png)
     return
\ No newline at end of file
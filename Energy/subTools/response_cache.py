@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime
+
+
+class CacheMiss(LookupError):
+    pass
+
+
+class ResponseCache:
+    '''
+    on-disk cache of API json responses.
+    key - endpoint, site / meter id, date window and extra request params (sha256, content addressed)
+    windows ended before today never expire (readings of complete day do not change),
+    other responses (today window, data period) live ttl seconds.
+    offline - replay mode, API is never called, missing response raises CacheMiss
+    '''
+    def __init__(self, directory, ttl=3600, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(endpoint, source_id, start_date=None, end_date=None, **params):
+        content = json.dumps(
+            {
+                'endpoint': endpoint,
+                'id': str(source_id),
+                'start': str(start_date) if start_date else None,
+                'end': str(end_date) if end_date else None,
+                'params': {key: str(value) for key, value in params.items()},
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def expires(self, end_date):
+        # None - immutable entry
+        if end_date is not None:
+            end_date = end_date.date() if isinstance(end_date, datetime) else end_date
+            if end_date < date.today():
+                return None
+        return time.time() + self.ttl
+
+    def get(self, endpoint, source_id, start_date=None, end_date=None, **params):
+        path = self.path(self.key(endpoint, source_id, start_date, end_date, **params))
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not self.offline and entry['expires'] is not None and entry['expires'] < time.time():
+            return None
+        return entry
+
+    def put(self, body, endpoint, source_id, start_date=None, end_date=None, **params):
+        path = self.path(self.key(endpoint, source_id, start_date, end_date, **params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            'endpoint': endpoint,
+            'id': str(source_id),
+            'start': str(start_date) if start_date else None,
+            'end': str(end_date) if end_date else None,
+            'stored': time.time(),
+            'expires': self.expires(end_date),
+            'body': body,
+        }
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(entry, file)
+        os.replace(temp_path, path)
+
+    def fetch(self, fetch, endpoint, source_id, start_date=None, end_date=None, **params):
+        #
+        #   return cached body or call fetch() and store its (json) result
+        #
+        entry = self.get(endpoint, source_id, start_date, end_date, **params)
+        if entry is not None:
+            self.hits += 1
+            return entry['body']
+        if self.offline:
+            raise CacheMiss('offline mode - no cached response for {} {} {} - {}'.format(
+                endpoint, source_id, start_date, end_date))
+        self.misses += 1
+        body = fetch()
+        self.put(body, endpoint, source_id, start_date, end_date, **params)
+        return body
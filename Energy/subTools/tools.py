@@ -1,5 +1,21 @@
+import json
 import os
-from datetime import datetime, timedelta
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None  # optional - kernels run as plain python
+
+PERIOD_FORMATS = {
+    'day': '%Y/%m/%d',
+    'week': '%Y/%W/%w',
+    'month': '%Y/%m',
+    'year': '%Y',
+}
 
 def file_list(directory, ext = ".csv", startswith = ""):
     return [
@@ -9,3 +25,114 @@ def file_list(directory, ext = ".csv", startswith = ""):
             and f.endswith(ext)
             ]
             
+
+def period_bounds(period, limit_min, limit_max):
+    '''
+    date range [start, stop) covering periods limit_min - limit_max
+    (labels as in day / week / month / year columns, e.g. 2021/08 - 2022/02 for month)
+    '''
+    def first_day(label):
+        return datetime.strptime(label + '/1' if period == 'week' else label, PERIOD_FORMATS[period])
+
+    start, last = first_day(limit_min), first_day(limit_max)
+    if period == 'day':
+        stop = last + timedelta(days=1)
+    elif period == 'week':
+        stop = last + timedelta(days=7)
+    elif period == 'month':
+        stop = (last.replace(day=28) + timedelta(days=4)).replace(day=1)
+    else:
+        stop = last.replace(year=last.year + 1)
+    return start, stop
+
+
+def jit(function):
+    '''
+    compile numeric kernel (loop over numpy arrays) with numba if it is installed, plain python function otherwise
+    '''
+    return njit(cache=True)(function) if njit else function
+
+
+def retry(fetch, attempts=5, base_delay=1, max_delay=60, exceptions=(Exception,), retryable=None):
+    '''
+    call fetch() up to attempts times.
+    between attempts sleep random time from 0 to base_delay * 2^attempt (exponential backoff, full jitter)
+    retryable(error) - False: error of exceptions is permanent, raised at once
+    '''
+    for attempt in range(attempts):
+        try:
+            return fetch()
+        except exceptions as E:
+            if attempt == attempts - 1 or (retryable and not retryable(E)):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            print('!!!!!!\n{} - retry {}/{} in {:.1f} s'.format(E, attempt + 1, attempts - 1, delay))
+            time.sleep(delay)
+
+
+class TokenBucket:
+    '''
+    thread safe request budget.
+    capacity - max number of requests available at once
+    period - seconds needed to refill the whole capacity (SolarEdge: daily quota -> 86400)
+    '''
+    def __init__(self, capacity, period=86400, used=0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = max(0, capacity - used)  # used - requests taken before (e.g. by earlier runs)
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def acquire(self, tokens=1):
+        # block until requested number of tokens is available
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    @property
+    def available(self):
+        with self.lock:
+            self._refill()
+            return int(self.tokens)
+
+
+class CallCounter:
+    '''
+    API calls used per key (site) per day, kept in json file - quota used by earlier runs is known.
+    file: {key: {day: calls}}, only today is kept
+    '''
+    def __init__(self, path, key):
+        self.path = path
+        self.key = str(key)
+        self.lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @property
+    def used(self):
+        return self._read().get(self.key, {}).get(date.today().isoformat(), 0)
+
+    def add(self, calls=1):
+        with self.lock:
+            counts = self._read()
+            today = date.today().isoformat()
+            counts[self.key] = {today: counts.get(self.key, {}).get(today, 0) + calls}
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path + '.tmp', 'w') as file:
+                json.dump(counts, file)
+            os.replace(self.path + '.tmp', self.path)
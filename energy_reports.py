@@ -5,6 +5,7 @@ import argparse
 from Energy import OUTPUT_DIR, set_debug, debug, switch_debug, get_debug
 from Energy.my_energy_reports import create_energy_reports
 from Energy.subProjection.my_projection import create_monthly_projection
+from Energy.subGraphs.my_render import RenderScheduler
 
 
 PERIODS_CONVERTER = {
@@ -20,6 +21,8 @@ parser.add_argument("-d", "--debug", help="switch on debug messages",
                     action="store_true")
 parser.add_argument("-r", "--refresh", help="action refresh data from API",
                     action="store_true")
+parser.add_argument("-o", "--offline", help="rebuild data from cached API responses, no network calls",
+                    action="store_true")
 parser.add_argument("-f", "--flash", help="add daily flash page to the report",
                     action="store_true")
 parser.add_argument("-t", "--table", help="add pure table data to the report",
@@ -28,6 +31,13 @@ parser.add_argument('-b', '--back', type=float, default=0.2, help='energy back c
 parser.add_argument('-k', '--kWh_cost', type=float, default=0.65, help='calculation kW cost (default=0.65 PLN)')
 parser.add_argument("-p", "--projection", type=int, help="projection n-month production forward, integer value")
 parser.add_argument("-g", "--group", default='daily', help="grouping param(daily, weekly, monthly), default daily")
+parser.add_argument('-w', '--workers', type=int, default=1, help='parallel API requests (default 1)')
+parser.add_argument('-s', '--storage', default='csv', choices=['csv', 'parquet', 'feather', 'partitioned', 'hourly', 'sqlite'], help='storage format of imported data (default csv)')
+parser.add_argument('--sweep', help='add page of savings over grid of export back and kWh cost',
+                    action="store_true")
+parser.add_argument('--png', help='write report charts to output folder as png files too',
+                    action="store_true")
+parser.add_argument('-j', '--jobs', type=int, default=1, help='processes rendering charts in parallel (default 1)')
 parser.add_argument('-l', '--limits', default='', help='range of periods to report (format 2021/08-2022/02')
 # try
 args = parser.parse_args()
@@ -44,10 +54,16 @@ print('----------------------\nstart settings\n----------------------')
 print('- debug messages switched {}'.format('on' if args.debug else 'off'))
 set_debug(args.debug)
 print('- refresh data from API -  {}'.format('yes' if args.refresh else 'no'))
+print('- offline (cached API responses only) -  {}'.format('yes' if args.offline else 'no'))
 print('- add flesh report -  {}'.format('yes' if args.flash else 'no'))
 print('- add pure table in the  report -  {}'.format('yes' if args.table else 'no'))
 print('- energy back cost -  {:4.2f}'.format(args.back))
 print('- kW cost -  {:4.2f} PLN'.format(args.kWh_cost))
+print('- parallel API requests -  {}'.format(args.workers))
+print('- storage format -  {}'.format(args.storage))
+print('- contract scenarios page -  {}'.format('yes' if args.sweep else 'no'))
+print('- chart rendering processes -  {}'.format(args.jobs))
+print('- charts saved as png files -  {}'.format('yes' if args.png else 'no'))
 if args.projection:
     print('- projection {} month{} production'.format(args.projection, 's' if args.projection>1 else ''))
 print('- {} reports'.format(args.group))
@@ -63,19 +79,30 @@ else:
 # run main application
 #
 energy_object, pdf = create_energy_reports(
-    refresh = args.refresh,
+    refresh = args.refresh or args.offline,
     group = args.group,
     export_back = 1 - args.back,
     kWh_cost = args.kWh_cost,
-    limit_periods = periods if args.limits else None
+    limit_periods = periods if args.limits else None,
+    workers = args.workers,
+    offline = args.offline,
+    storage = args.storage,
+    save_png = args.png
 )
 pdf.set_author("Piotr Kalista")
 pdf.set_creator("energy reports.py")
 pdf.set_title("PV energy report")
-if args.flash:
-    energy_object.daily_flash_page(pdf=pdf)
+#
+# charts are rendered in parallel, pages are laid out when all of them are ready
+#
+with RenderScheduler(pdf, args.jobs) as render:
+    if args.flash:
+        energy_object.daily_flash_page(pdf=render.pdf, render=render)
+
+    energy_object.group_report_pages(pdf=render.pdf, render=render, group_by=PERIODS_CONVERTER[args.group], table_include=args.table)
 
-energy_object.group_report_pages(pdf=pdf, group_by=PERIODS_CONVERTER[args.group], table_include=args.table)
+    if args.sweep:
+        energy_object.sweep_page(pdf=render.pdf, render=render)
 
 if args.projection:
     create_monthly_projection(energy_object, args.projection, pdf=pdf)
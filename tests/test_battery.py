@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Energy as package
+from Energy.subEnergy.my_battery import simulate_battery
+from Energy.subEnergy.my_energy import BatteryEnergy, Energy
+
+
+def grid(hours=24 * 30, seed=3):
+    # daytime surplus, evening / night deficit
+    rng = np.random.default_rng(seed)
+    hour = np.arange(hours) % 24
+    day = (hour >= 9) & (hour < 17)
+    export_ = np.where(day, rng.uniform(0, 3, hours), 0.0)
+    import_ = np.where(day, 0.0, rng.uniform(0, 1.5, hours))
+    return import_, export_
+
+
+def test_energy_is_conserved():
+    import_, export_ = grid()
+    efficiency = 0.81
+    result = simulate_battery(import_, export_, [2, 5, 10, 40], efficiency=efficiency)
+    charged = export_.sum() - result['export_'].sum(axis=0)
+    discharged = import_.sum() - result['import_'].sum(axis=0)
+    # energy left in battery is not counted as discharged yet (efficiency_out = sqrt(efficiency))
+    left = result['soc_'][-1] * np.sqrt(efficiency)
+    assert discharged + left == pytest.approx(charged * efficiency)
+    assert (discharged > 0).all()
+
+
+def test_capacity_and_power_limits():
+    import_, export_ = grid()
+    capacity = np.array([1.0, 4.0, 12.0])
+    result = simulate_battery(import_, export_, capacity, charge_power=0.7, discharge_power=0.4, efficiency=0.9)
+    soc = result['soc_']
+    assert (soc >= -1e-12).all()
+    assert (soc <= capacity + 1e-12).all()
+    assert np.isclose(soc.max(axis=0), capacity).any()  # small batteries get full
+    charged = export_[:, None] - result['export_']
+    discharged = import_[:, None] - result['import_']
+    assert (charged >= -1e-12).all() and (charged <= 0.7 + 1e-12).all()
+    assert (discharged >= -1e-12).all() and (discharged <= 0.4 + 1e-12).all()
+    assert (result['import_'] >= -1e-12).all() and (result['export_'] >= -1e-12).all()
+
+
+def test_power_is_scaled_by_row_length():
+    import_, export_ = np.array([0.0, 10.0]), np.array([10.0, 0.0])
+    result = simulate_battery(import_, export_, 100, charge_power=2, discharge_power=2, efficiency=1.0, hours=0.25)
+    assert result['export_'][:, 0].tolist() == [9.5, 0.0]
+    assert result['import_'][:, 0].tolist() == [0.0, 9.5]
+
+
+def test_zero_capacity_gives_original_series():
+    import_, export_ = grid()
+    result = simulate_battery(import_, export_, 0)
+    np.testing.assert_array_equal(result['import_'][:, 0], import_)
+    np.testing.assert_array_equal(result['export_'][:, 0], export_)
+    assert not result['soc_'].any()
+
+
+def test_battery_source_follows_energy_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(package, 'debug', False)
+    import_, export_ = grid(48)
+    dates = pd.date_range('2021-08-01', periods=48, freq='H')
+    energy = Energy(source_name='Tauron', storage_dir=str(tmp_path) + '/', refresh=False)
+    energy.add_df(pd.DataFrame({'date': dates[:24], 'import_': import_[:24], 'export_': export_[:24]}))
+    battery = BatteryEnergy(energy, 5, storage_dir=str(tmp_path) + '/')
+    assert len(battery.raw_energy.index) == 24
+    energy.append_df(pd.DataFrame({'date': dates[24:], 'import_': import_[24:], 'export_': export_[24:]}))
+    expected = simulate_battery(import_, export_, 5)
+    assert len(battery.raw_energy.index) == 48
+    np.testing.assert_allclose(battery.raw_energy['import_'], expected['import_'][:, 0] - import_)
+    np.testing.assert_allclose(battery.soc, expected['soc_'][:, 0])
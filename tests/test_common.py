@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Energy as package
+from Energy.subEnergy.my_energy import CommonEnergy, Energy
+
+
+def readings(start, days, seed, **columns):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=24 * days, freq='H')
+    return pd.DataFrame({'date': dates, **{col: rng.uniform(0, scale, len(dates)) for col, scale in columns.items()}})
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    monkeypatch.setattr(package, 'debug', False)
+    solar = Energy(source_name='SolarEdge', storage_dir=str(tmp_path) + '/', refresh=False)
+    solar.add_df(readings('2021-08-01', 5, 1, production_=3))
+    grid = Energy(source_name='Tauron', storage_dir=str(tmp_path) + '/', refresh=False)
+    grid.add_df(readings('2021-08-01', 3, 2, import_=1, export_=2))
+    return solar, grid
+
+
+def rows(energy):
+    temp_df = energy.get_energy.astype({'source': str, 'direction': str})
+    return temp_df.sort_values(['date', 'source']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('align', [False, True])
+def test_incremental_merge_equals_full_rebuild(sources, align, tmp_path):
+    solar, grid = sources
+    common = CommonEnergy([solar, grid], align=align, storage_dir=str(tmp_path) + '/', export_back=0.8)
+    assert common.stop_date == pd.Timestamp('2021-08-03')
+    grid.append_df(readings('2021-08-04', 3, 3, import_=1, export_=2))  # overlap grows - solar days 4, 5 are back
+    solar.append_df(readings('2021-08-06', 2, 4, production_=3))
+    assert common.stop_date == pd.Timestamp('2021-08-06')
+    rebuilt = CommonEnergy([solar, grid], align=align, storage_dir=str(tmp_path) + '/', export_back=0.8)
+    pd.testing.assert_frame_equal(rows(common), rows(rebuilt), check_like=True)
+    pd.testing.assert_series_equal(common.totals(), rebuilt.totals())
+
+
+def test_stacked_merge_keeps_source_data(sources, tmp_path):
+    solar, grid = sources
+    balance = grid.totals()['balance_']
+    common = CommonEnergy([solar, grid], storage_dir=str(tmp_path) + '/', export_back=0.5)
+    common.refresh__energy_df()
+    assert grid.get_energy['balance_'].sum() == pytest.approx(balance)
+    assert grid.totals()['balance_'] == pytest.approx(balance)
+    assert common.totals()['balance_'] != pytest.approx(balance)
@@ -0,0 +1,80 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+import requests
+from solaredge import solaredge as se
+
+import Energy as package
+from Energy.subEnergy.my_energy import Energy
+from Energy.subEnergy.my_intrerfaces import SolarEdge_Interface
+from Energy.subEnergy.my_solaredge import MySolarEdge
+from Energy.subTools.mock_solaredge import MockSolarEdge
+
+
+def test_second_run_fetches_again_from_last_stored_day(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(package, 'debug', False)
+    with MockSolarEdge('2021-08-01', '2021-08-06') as mock:
+        monkeypatch.setattr(se, 'BASEURL', mock.url)
+        MySolarEdge('key', 1, storage_dir=str(tmp_path) + '/')
+        first_requests = mock.requests
+        capsys.readouterr()
+        energy = MySolarEdge('key', 1, storage_dir=str(tmp_path) + '/')
+    assert '!!!!!' not in capsys.readouterr().out
+    assert mock.requests - first_requests == 2  # data period, last stored day
+    temp_df = energy.get_energy
+    assert len(temp_df.index) == 6 * 24
+    assert temp_df['date'].is_unique
+    assert energy.drop_last_day() == date(2021, 8, 6)
+    assert pd.read_csv(energy.storage_file)['date'].nunique() == 6 * 24
+
+
+@pytest.mark.parametrize('time_unit, windows', [
+    ('HOUR', [('2021-08-20', '2021-08-31'), ('2021-09-01', '2021-09-30'), ('2021-10-01', '2021-10-31'),
+              ('2021-11-01', '2021-11-30'), ('2021-12-01', '2021-12-31'), ('2022-01-01', '2022-01-10')]),
+    ('DAY', [('2021-08-20', '2021-12-31'), ('2022-01-01', '2022-01-10')]),  # years, not before data period
+])
+def test_windows_are_calendar_months(tmp_path, monkeypatch, time_unit, windows):
+    monkeypatch.setattr(package, 'debug', False)
+    monkeypatch.chdir(tmp_path)  # calls counter file
+    windows = [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in windows]
+    with MockSolarEdge('2021-08-20', '2022-01-10') as mock:
+        login_data = {'KEY': 'key', 'ID': 1, 'URL': mock.url, 'TIME_UNIT': time_unit}
+        with SolarEdge_Interface(login_data, None, None, Energy.UNITS) as connection:
+            full = list(connection.windows())
+        with SolarEdge_Interface(login_data, '2021-09-15', None, Energy.UNITS) as connection:
+            incremental = list(connection.windows())
+    assert full == windows
+    assert incremental == [window for window in windows if window[1] >= date(2021, 9, 15)]
+
+
+def test_daily_quota_used_by_earlier_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(package, 'debug', False)
+    monkeypatch.chdir(tmp_path)  # calls counter file without cache
+    with MockSolarEdge('2021-08-20', '2021-10-10') as mock:
+        login_data = {'KEY': 'key', 'ID': 1, 'URL': mock.url, 'DAILY_QUOTA': 50}
+        with SolarEdge_Interface(login_data, None, None, Energy.UNITS) as connection:
+            assert connection.budget.available == 49  # data period
+            assert sum(len(temp_df.index) for temp_df in connection.get_dataset()) == 52 * 24
+        with SolarEdge_Interface(login_data, None, None, Energy.UNITS) as connection:
+            assert connection.budget.available == 45  # data period, 3 months, data period
+        with SolarEdge_Interface(dict(login_data, ID=2), None, None, Energy.UNITS) as connection:
+            assert connection.budget.available == 49  # quota of other site
+    assert mock.requests == 6
+
+
+def test_legacy_loop_does_not_retry_client_errors(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(package, 'debug', False)
+    calls = []
+
+    def get_energy(*args, **kwargs):
+        calls.append(args)
+        response = requests.Response()
+        response.status_code = 403
+        raise requests.HTTPError('403 Client Error: Forbidden', response=response)
+    monkeypatch.setattr(se.Solaredge, 'get_energy', get_energy)
+    with MockSolarEdge('2021-08-01', '2021-08-06') as mock:
+        monkeypatch.setattr(se, 'BASEURL', mock.url)
+        MySolarEdge('key', 1, storage_dir=str(tmp_path) + '/')
+    assert 'retry' not in capsys.readouterr().out
+    assert len(calls) == 1
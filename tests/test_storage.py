@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Energy as package
+from Energy.subEnergy.my_energy import Energy
+from Energy.subStorage.my_storage import STORAGE_BACKENDS, Storage
+
+COLUMNS = ['date', 'source', 'direction', 'production_', 'export_', 'import_']
+
+
+def energy_df(start, periods, shift=0.0):
+    dates = pd.date_range(start, periods=periods, freq='H')
+    values = np.arange(periods, dtype=np.float64) + shift
+    return pd.DataFrame({
+        'date': dates,
+        'source': 'SolarEdge',
+        'direction': 'None',
+        'production_': values,
+        'export_': values / 2,
+        'import_': values / 4,
+    })
+
+
+def stored(store, *args, **kwargs):
+    temp_df = store.load(COLUMNS, *args, **kwargs).reset_index(drop=True)
+    return temp_df[COLUMNS].astype({'source': str, 'direction': str})
+
+
+@pytest.fixture(params=sorted(STORAGE_BACKENDS))
+def store(request, tmp_path):
+    return STORAGE_BACKENDS[request.param](str(tmp_path) + '/', 'SolarEdge')
+
+
+def test_round_trip(store):
+    temp_df = energy_df('2021-08-30', 24 * 5)  # crosses month boundary (partitions)
+    assert not store.exists()
+    store.save(temp_df)
+    assert store.exists()
+    pd.testing.assert_frame_equal(stored(store), temp_df, check_dtype=False)
+
+
+def test_save_replaces_data(store):
+    store.save(energy_df('2021-08-01', 48))
+    store.save(energy_df('2021-08-01', 24, shift=100))
+    pd.testing.assert_frame_equal(stored(store), energy_df('2021-08-01', 24, shift=100), check_dtype=False)
+
+
+def test_upsert_overlap(store):
+    store.save(energy_df('2021-08-30', 72))
+    store.upsert(energy_df('2021-08-31 12:00', 72, shift=1000))  # last 36 hours replaced, 36 new
+    expected = pd.concat(
+        [energy_df('2021-08-30', 36), energy_df('2021-08-31 12:00', 72, shift=1000)], ignore_index=True
+    )
+    result = stored(store)
+    assert result['date'].is_unique
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_upsert_creates_store(store):
+    store.upsert(energy_df('2021-08-01', 24))
+    pd.testing.assert_frame_equal(stored(store), energy_df('2021-08-01', 24), check_dtype=False)
+
+
+def test_load_range(store):
+    temp_df = energy_df('2021-07-25', 24 * 20)
+    store.save(temp_df)
+    start, stop = pd.Timestamp('2021-07-31 22:00'), pd.Timestamp('2021-08-02 03:00')
+    expected = temp_df[(temp_df['date'] >= start) & (temp_df['date'] < stop)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(stored(store, start, stop), expected, check_dtype=False)
+    assert stored(store, start=pd.Timestamp('2021-08-13 23:00'))['date'].tolist() == [pd.Timestamp('2021-08-13 23:00')]
+    assert stored(store, stop=pd.Timestamp('2021-07-25 01:00'))['date'].tolist() == [pd.Timestamp('2021-07-25')]
+    assert stored(store, pd.Timestamp('2021-09-01'), pd.Timestamp('2021-09-02')).empty
+
+
+def test_projection(store):
+    store.save(energy_df('2021-08-01', 24))
+    temp_df = store.load(['import_'])
+    assert list(temp_df.columns) == ['date', 'import_']
+    assert temp_df['import_'].tolist() == (np.arange(24) / 4).tolist()
+
+
+def test_missing_store(store):
+    with pytest.raises(FileNotFoundError):
+        store.load()
+
+
+def test_missing_hours_stay_missing(store):
+    temp_df = energy_df('2021-08-01', 48)
+    temp_df = temp_df[~temp_df['date'].dt.hour.isin([3, 4, 17])].reset_index(drop=True)
+    store.save(temp_df)
+    store.upsert(energy_df('2021-08-03 05:00', 2, shift=7))  # new hours after gap
+    expected = pd.concat([temp_df, energy_df('2021-08-03 05:00', 2, shift=7)], ignore_index=True)
+    pd.testing.assert_frame_equal(stored(store), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('storage', ['parquet', 'partitioned'])
+def test_legacy_csv_is_converted_to_raw_columns(tmp_path, monkeypatch, storage):
+    monkeypatch.setattr(package, 'debug', False)
+    temp_df = energy_df('2021-08-01', 48)
+    temp_df['balance_'] = temp_df['export_'] - temp_df['import_']  # derived columns saved by older versions
+    temp_df['day'] = temp_df['date'].dt.date
+    temp_df.to_csv(str(tmp_path) + '/SolarEdge.csv')
+    energy = Energy(source_name='SolarEdge', storage=storage, storage_dir=str(tmp_path) + '/', refresh=False)
+    assert sorted(energy.store.load().columns) == sorted(COLUMNS)
+    assert energy.totals()['balance_'] == pytest.approx(temp_df['balance_'].sum())
+
+
+def test_sqlite_push_down_equals_pandas(tmp_path, monkeypatch):
+    monkeypatch.setattr(package, 'debug', False)
+    rng = np.random.default_rng(5)
+    temp_df = energy_df('2021-12-20', 24 * 60)  # crosses year, weeks 00 / 52
+    for col in Storage.VALUE_COLUMNS:
+        temp_df[col] = rng.uniform(0, 2, len(temp_df.index))
+    STORAGE_BACKENDS['sqlite'](str(tmp_path) + '/', 'SolarEdge').save(temp_df)
+    loaded = Energy(source_name='SolarEdge', storage='sqlite', storage_dir=str(tmp_path) + '/', refresh=False)
+    loaded.energy_frame([])
+    monkeypatch.setattr(package, 'debug', True)  # import message - totals
+    lazy = Energy(source_name='SolarEdge', storage='sqlite', storage_dir=str(tmp_path) + '/', refresh=False)
+    for group_by, agg in [('day', 'sum'), ('week', 'sum'), ('month', 'mean'), (['year', 'month'], 'sum'), ('hour', 'mean')]:
+        pushed = lazy.get_sum(group_by, agg=agg)
+        expected = loaded.get_sum(group_by, agg=agg)
+        keys = Energy.group_list(group_by)
+        pd.testing.assert_frame_equal(
+            pushed[keys].astype(expected[keys].dtypes.to_dict()).reset_index(drop=True), expected[keys].reset_index(drop=True)
+        )
+        for col in [col for col in pushed.columns if col.endswith('_')]:
+            np.testing.assert_allclose(pushed[col], expected[col])
+    pd.testing.assert_series_equal(lazy.totals().sort_index(), loaded.totals().sort_index().astype(np.float64), check_names=False)
+    assert lazy.unit_recalc('month', ['production_'], 'sum') == loaded.unit_recalc('month', ['production_'], 'sum')
+    assert lazy._lazy_load is not None  # nothing loaded
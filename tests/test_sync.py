@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Energy as package
+from Energy.subEnergy import my_energy
+from Energy.subEnergy.my_energy import Energy
+from Energy.subEnergy.my_intrerfaces import Energy_Interface
+from Energy.subStorage.my_storage import STORAGE_BACKENDS
+
+LAST_DAY = date(2021, 8, 10)
+
+
+class FakeInterface(Energy_Interface):
+    # hourly readings up to LAST_DAY, requested windows are recorded
+    name = 'Fake'
+    calls = []
+
+    def _init_connection(self):
+        self.end_date = LAST_DAY
+
+    def _close_connection(self):
+        pass
+
+    def get_dataset(self):
+        yield from self.fetch_windows(self._get_window)
+
+    def _get_window(self, imp_start_date, imp_end_date):
+        FakeInterface.calls.append((imp_start_date, imp_end_date))
+        dates = pd.date_range(imp_start_date, imp_end_date + timedelta(days=1), freq='H', inclusive='left')
+        return pd.DataFrame({'date': dates, 'import_': np.arange(len(dates)) / 10})
+
+
+@pytest.fixture
+def sync(tmp_path, monkeypatch):
+    monkeypatch.setattr(package, 'debug', False)
+    monkeypatch.setitem(my_energy.LOGIN_INTERFACE, 'Fake', FakeInterface)
+    FakeInterface.calls = []
+
+    def run(storage, **kwargs):
+        return Energy(
+            source_name='Fake', storage=storage, storage_dir=str(tmp_path) + '/',
+            start_date=date(2021, 8, 1), day_batch=2, **kwargs
+        )
+    return run
+
+
+@pytest.mark.parametrize('storage', sorted(STORAGE_BACKENDS))
+def test_range_limited_sync_fetches_only_partial_window(sync, storage, capsys):
+    sync(storage)
+    assert len(FakeInterface.calls) == 6
+    watermark = {'last_complete': '2021-08-09T23:00:00', 'partial_window': ['2021-08-10T00:00:00', '2021-08-10T23:00:00']}
+    FakeInterface.calls = []
+    energy = sync(storage, load_range=(pd.Timestamp('2021-08-02'), pd.Timestamp('2021-08-04')))
+    assert 'sync state newer than stored data' not in capsys.readouterr().out
+    assert FakeInterface.calls == [(LAST_DAY, LAST_DAY)]
+    assert energy.watermark == watermark
+    days = energy.energy_frame(['day'])['day'].dt.date.unique().tolist()
+    assert days == [date(2021, 8, 2), date(2021, 8, 3), LAST_DAY]
+    assert len(energy.store.load().index) == 240
+
+
+def test_flushed_blocks_are_merged_into_data(sync, monkeypatch):
+    sizes = []
+    flush_staged = Energy.flush_staged
+
+    def flush_and_measure(self):
+        flush_staged(self)
+        sizes.append(len(self._energy_df.index))
+    monkeypatch.setattr(Energy, 'flush_staged', flush_and_measure)
+    energy = sync('parquet', flush_size=30)  # windows: 1 day, 4 x 2 days, 1 day (flushed by commit)
+    assert sizes == [72, 120, 168, 216, 240]
+    expected = sync('sqlite', flush_size=10 ** 6)  # flushed once (commit)
+    pd.testing.assert_frame_equal(energy.energy_frame([]), expected.energy_frame([]))
+
+
+def test_windows_are_fixed_for_every_sync_start():
+    def windows(start_date, day_batch):
+        connection = FakeInterface({}, start_date, day_batch, first_date=date(2021, 7, 30))
+        connection._init_connection()
+        return list(connection.windows())
+    for day_batch in [1, 3, 7]:
+        full = windows(date(2021, 7, 30), day_batch)
+        assert full[0][0] == date(2021, 7, 30) and full[-1][1] == LAST_DAY
+        assert all(end + timedelta(days=1) == start for (_, end), (start, _) in zip(full, full[1:]))
+        for start_date in pd.date_range('2021-07-30', LAST_DAY).date:
+            incremental = windows(start_date, day_batch)
+            assert incremental == full[-len(incremental):]
+            assert incremental[0][0] <= start_date
+    assert windows(date(2021, 8, 4), 7)[0] == (date(2021, 8, 2), date(2021, 8, 8))  # monday - sunday
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Energy as package
+from Energy.subEnergy.my_energy import Energy
+from Energy.subEnergy.my_tariff import Tariff, holidays_pl, settle
+
+
+def settled(rows, export_back=1.0):
+    # rows: (date, import_, export_)
+    dates, import_, export_ = zip(*rows)
+    return settle(pd.DatetimeIndex(dates), import_, export_, Tariff.single(1.0), export_back=export_back)
+
+
+def test_deposit_expires_exactly_after_12_months():
+    result = settled([
+        ('2021-01-01 10:00', 0, 10),
+        ('2022-01-01 10:00', 5, 0),
+    ])
+    assert result['offset_'].tolist() == [0, 0]
+    assert result['expired_'].tolist() == [0, 10]
+    assert result['paid_'].tolist() == [0, 5]
+    assert result['bank_'].tolist() == [10, 0]
+
+
+def test_deposit_is_usable_until_last_hour_before_expiry():
+    result = settled([
+        ('2021-01-01 10:00', 0, 10),
+        ('2022-01-01 09:00', 5, 0),
+        ('2022-01-01 10:00', 0, 0),
+    ])
+    assert result['offset_'].tolist() == [0, 5, 0]
+    assert result['expired_'].tolist() == [0, 0, 5]
+    assert result['bank_'].tolist() == [10, 5, 0]
+
+
+def test_import_is_offset_from_oldest_deposits_first():
+    result = settled([
+        ('2021-03-01 10:00', 0, 2),
+        ('2021-03-01 11:00', 0, 3),
+        ('2021-03-01 12:00', 0, 4),
+        ('2021-03-01 20:00', 6, 0),  # whole first and second deposit, 1 of third
+        ('2022-03-01 11:00', 0, 0),  # first and second deposit expire - nothing left of them
+        ('2022-03-01 12:00', 0, 0),  # rest of third deposit expires
+    ])
+    assert result['offset_'].tolist() == [0, 0, 0, 6, 0, 0]
+    assert result['expired_'].tolist() == [0, 0, 0, 0, 0, 3]
+    assert result['bank_'].tolist() == [2, 5, 9, 3, 3, 0]
+
+
+def test_expired_total_is_banked_energy_not_used():
+    rng = np.random.default_rng(1)
+    dates = pd.date_range('2020-01-01', '2022-12-31 23:00', freq='H')
+    import_ = rng.exponential(0.3, len(dates))
+    export_ = rng.exponential(1.0, len(dates))  # surplus - part of bank expires
+    result = settle(dates, import_, export_, Tariff.single(0.7), export_back=0.8)
+    assert result['banked_'].sum() == pytest.approx(result['offset_'].sum() + result['expired_'].sum() + result['bank_'].iloc[-1])
+    assert result['expired_'].sum() > 0
+    assert (result['offset_'] <= import_ + 1e-12).all()
+    assert result['cost'].sum() == pytest.approx(0.7 * result['paid_'].sum())
+
+
+@pytest.mark.parametrize('timestamp, g12, g12w', [
+    ('2021-11-02 10:00', 'day', 'day'),  # Tuesday
+    ('2021-11-02 13:00', 'night', 'night'),  # Tuesday, cheap zone 13-15
+    ('2021-11-06 10:00', 'day', 'night'),  # Saturday
+    ('2021-11-01 10:00', 'day', 'night'),  # Monday, All Saints' Day
+    ('2022-04-18 10:00', 'day', 'night'),  # Easter Monday
+])
+def test_zones_on_weekend_and_holiday(timestamp, g12, g12w):
+    dates = pd.DatetimeIndex([timestamp])
+    for tariff, zone in [(Tariff.day_night(0.8, 0.4), g12), (Tariff.weekend(0.8, 0.4), g12w)]:
+        assert tariff.zones[tariff.zone_codes(dates)[0]] == zone
+        assert tariff.price(dates)[0] == (0.8 if zone == 'day' else 0.4)
+
+
+def test_settlement_cost_uses_zone_prices():
+    dates = pd.DatetimeIndex(['2021-11-02 10:00', '2021-11-06 10:00'])
+    result = settle(dates, [1, 1], [0, 0], Tariff.weekend(0.8, 0.4))
+    assert result['zone'].tolist() == ['day', 'night']
+    assert result['cost'].tolist() == [0.8, 0.4]
+
+
+def test_polish_holidays():
+    holidays = holidays_pl([2022])
+    assert pd.Timestamp('2022-04-17').date() in holidays  # Easter Sunday
+    assert pd.Timestamp('2022-06-16').date() in holidays  # Corpus Christi
+    assert len(holidays) == 13
+
+
+@pytest.fixture
+def energy(tmp_path, monkeypatch):
+    monkeypatch.setattr(package, 'debug', False)
+    rng = np.random.default_rng(2)
+    dates = pd.date_range('2021-08-01', '2022-02-28 23:00', freq='H')
+    energy = Energy(source_name='Tauron', storage_dir=str(tmp_path) + '/', refresh=False, export_back=0.8,
+                    tariff=Tariff.weekend(0.8, 0.4))
+    energy.add_df(pd.DataFrame({
+        'date': dates,
+        'production_': rng.exponential(0.6, len(dates)),
+        'import_': rng.exponential(0.4, len(dates)),
+        'export_': rng.exponential(0.4, len(dates)),
+    }))
+    return energy
+
+
+def test_sweep_of_tariff_agrees_with_settlement(energy):
+    result = energy.sweep(export_back=[0.5, 0.8], kWh_cost=[0.4, 0.8])
+    settlement = energy.settlement()
+    current = result[(result['export_back'] == 0.8) & (result['kWh_cost'] == 0.8)].iloc[0]
+    assert current['costs'] == pytest.approx(settlement['cost'].sum())
+    assert current['savings'] == pytest.approx(settlement['base_cost'].sum() - settlement['cost'].sum())
+    half = result[(result['export_back'] == 0.8) & (result['kWh_cost'] == 0.4)].iloc[0]
+    assert half['savings'] == pytest.approx(current['savings'] / 2)  # all zone prices scaled
+    lower_back = result[(result['export_back'] == 0.5) & (result['kWh_cost'] == 0.8)].iloc[0]
+    assert lower_back['costs'] == pytest.approx(energy.settlement(export_back=0.5)['cost'].sum())
+    by_month = energy.sweep(export_back=[0.8], kWh_cost=[0.8], group_by='month')
+    assert by_month['month'].tolist() == ['2021/08', '2021/09', '2021/10', '2021/11', '2021/12', '2022/01', '2022/02']
+    assert by_month['savings'].sum() == pytest.approx(current['savings'])